@@ -0,0 +1,255 @@
+import contextvars
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core import metrics, timings
+
+_missing = object()
+# get_many базового класса вызывает get: такие вызовы не учитываем дважды
+_in_get_many = contextvars.ContextVar('cache_in_get_many', default=False)
+
+
+class InstrumentedCacheMixin:
+    """Учитывает попадания и промахи кэша в RequestTimings."""
+
+    def _record(self, hits, misses):
+        request_timings = timings.current()
+        if request_timings is not None:
+            request_timings.cache_hits += hits
+            request_timings.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        hit = value is not _missing
+        if not _in_get_many.get():
+            self._record(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        token = _in_get_many.set(True)
+        try:
+            values = super().get_many(keys, version)
+        finally:
+            _in_get_many.reset(token)
+        self._record(len(values), len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class TwoTierCache(BaseCache):
+    """Небольшой LRU-кэш процесса перед общим кэшем.
+
+    Общий кэш задаётся псевдонимом из CACHES в OPTIONS['SHARED_CACHE'].
+    Записи сразу уходят в общий кэш, а чтения сначала ищутся в локальном
+    словаре, ограниченном по количеству (MAX_ENTRIES), суммарному
+    размеру (LOCAL_MAX_BYTES) и времени жизни (LOCAL_TIMEOUT). Другие
+    процессы видят изменения не позже чем через LOCAL_TIMEOUT секунд;
+    invalidate_local() и clear() сбрасывают локальные копии во всех
+    процессах через эпоху в общем кэше, которая проверяется не чаще
+    раза в EPOCH_INTERVAL секунд.
+    """
+    epoch_key = 'two-tier:epoch'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_CACHE', 'shared')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._max_bytes = options.get('LOCAL_MAX_BYTES', 8 * 1024 * 1024)
+        self._epoch_interval = options.get('EPOCH_INTERVAL', 1)
+        self._local = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._epoch_checked = 0
+        self._counters = Counter()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        """Попадания и промахи по уровням с начала работы процесса."""
+        with self._lock:
+            result = {'entries': len(self._local), 'bytes': self._size}
+            for tier in ('local', 'shared'):
+                hits = self._counters[f'{tier}_hits']
+                misses = self._counters[f'{tier}_misses']
+                result[tier] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'ratio': hits / (hits + misses) if hits + misses else 0,
+                }
+        return result
+
+    def _check_epoch(self):
+        now = time.monotonic()
+        if now - self._epoch_checked < self._epoch_interval:
+            return
+        self._epoch_checked = now
+        epoch = self.shared.get(self.epoch_key)
+        if epoch != self._epoch:
+            self._clear_local()
+            self._epoch = epoch
+
+    def _clear_local(self):
+        with self._lock:
+            self._local.clear()
+            self._size = 0
+
+    def _drop(self, local_key):
+        entry = self._local.pop(local_key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def _get_local(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._local.move_to_end(local_key)
+                self._counters['local_hits'] += 1
+                metrics.CACHE_REQUESTS.inc(tier='local', result='hit')
+                return pickle.loads(entry[0])
+            self._drop(local_key)
+            self._counters['local_misses'] += 1
+        metrics.CACHE_REQUESTS.inc(tier='local', result='miss')
+        return _missing
+
+    def _set_local(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None or timeout > self._local_timeout:
+            timeout = self._local_timeout
+        if timeout <= 0:
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(pickled) > self._max_bytes:
+            return
+        with self._lock:
+            self._drop(local_key)
+            self._local[local_key] = (pickled, time.monotonic() + timeout)
+            self._size += len(pickled)
+            while (self._size > self._max_bytes
+                   or len(self._local) > self._max_entries):
+                _, (evicted, _) = self._local.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _shared_result(self, hits, misses):
+        with self._lock:
+            self._counters['shared_hits'] += hits
+            self._counters['shared_misses'] += misses
+        if hits:
+            metrics.CACHE_REQUESTS.inc(hits, tier='shared', result='hit')
+        if misses:
+            metrics.CACHE_REQUESTS.inc(misses, tier='shared', result='miss')
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        self._check_epoch()
+        value = self._get_local(local_key)
+        if value is not _missing:
+            return value
+        value = self.shared.get(key, _missing, version)
+        hit = value is not _missing
+        self._shared_result(int(hit), int(not hit))
+        if not hit:
+            return default
+        self._set_local(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._check_epoch()
+        found, missing = {}, []
+        for key in keys:
+            local_key = self.make_key(key, version)
+            self.validate_key(local_key)
+            value = self._get_local(local_key)
+            if value is _missing:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared_values = self.shared.get_many(missing, version)
+            self._shared_result(
+                len(shared_values), len(missing) - len(shared_values)
+            )
+            for key, value in shared_values.items():
+                self._set_local(self.make_key(key, version), value)
+            found.update(shared_values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._set_local(self.make_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._set_local(self.make_key(key, version), value, timeout)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version) or []
+        for key, value in data.items():
+            if key not in failed:
+                self._set_local(self.make_key(key, version), value, timeout)
+        return failed
+
+    def _forget(self, keys, version):
+        with self._lock:
+            for key in keys:
+                self._drop(self.make_key(key, version))
+
+    def delete(self, key, version=None):
+        self._forget([key], version)
+        return self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._forget(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget([key], version)
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # Атомарность обеспечивает только общий кэш
+        self._forget([key], version)
+        return self.shared.incr(key, delta, version)
+
+    def has_key(self, key, version=None):
+        local_key = self.make_key(key, version)
+        self._check_epoch()
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is not None and entry[1] > time.monotonic():
+                return True
+        return self.shared.has_key(key, version)
+
+    def invalidate_local(self):
+        """Сбросить локальные копии во всех процессах."""
+        epoch = uuid.uuid4().hex
+        self.shared.set(self.epoch_key, epoch, None)
+        self._clear_local()
+        self._epoch = epoch
+
+    def clear(self):
+        self.shared.clear()
+        self.invalidate_local()
+
+
+class InstrumentedTwoTierCache(InstrumentedCacheMixin, TwoTierCache):
+    pass
@@ -0,0 +1,125 @@
+"""Вспомогательные функции для работы с кэшем."""
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from .routers import use_primary
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name):
+    """Текущее поколение набора кэшированных данных.
+
+    Поколение входит в ключи кэша, поэтому его увеличение делает
+    недоступными все старые записи сразу, без их перебора.
+    """
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        # Начальное значение зависит от времени: после вытеснения
+        # счётчика старые ключи не будут использованы повторно.
+        generation = int(time.time() * 1000)
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(name):
+    """Сбросить все записи кэша, привязанные к поколению name."""
+    key = _generation_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = int(time.time() * 1000)
+        cache.set(key, generation, None)
+        return generation
+
+
+def touch_generation(name):
+    """Поднять поколение name до текущего времени в миллисекундах.
+
+    Такое поколение растёт монотонно и одновременно служит временем
+    последнего изменения данных, например для заголовка Last-Modified.
+    """
+    generation = max(int(time.time() * 1000), get_generation(name) + 1)
+    cache.set(_generation_key(name), generation, None)
+    return generation
+
+
+def generation_time(generation):
+    """Момент времени, соответствующий поколению из touch_generation."""
+    return datetime.fromtimestamp(generation / 1000, tz=timezone.utc)
+
+
+def generations_unchanged(generations):
+    """Проверить одним обращением к кэшу, что поколения не менялись.
+
+    generations - словарь {имя: поколение}; вытесненное из кэша
+    поколение считается изменившимся.
+    """
+    keys = {_generation_key(name): value
+            for name, value in generations.items()}
+    current = cache.get_many(list(keys))
+    return all(current.get(key) == value for key, value in keys.items())
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=1.0,
+                   lock_timeout=10):
+    """Значение из кэша с защитой от одновременного пересчёта.
+
+    Значение хранится вместе со сроком свежести и временем последнего
+    вычисления. Незадолго до срока запрос с вероятностью, растущей по
+    мере приближения к нему, пересчитывает значение заранее (чем
+    дороже вычисление и больше beta, тем раньше). Пересчитывает только
+    запрос, получивший блокировку; остальные в течение stale_timeout
+    после срока получают устаревшее значение. Если значения нет
+    совсем, они ждут результата до lock_timeout секунд. compute
+    читает с основной базы (core.routers.use_primary).
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        # random() может вернуть 0: log(1 - random()) определён всегда
+        early = delta * beta * -math.log(1 - random.random())
+        if time.time() + early < expires:
+            return value
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, True, lock_timeout)
+    if not locked:
+        if entry is not None:
+            return entry[0]
+        entry = _wait_for(key, lock_key, lock_timeout)
+        if entry is not None:
+            return entry[0]
+    try:
+        start = time.time()
+        with use_primary():
+            value = compute()
+        delta = time.time() - start
+        cache.set(key, (value, start + delta + timeout, delta),
+                  timeout + stale_timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def _wait_for(key, lock_key, lock_timeout):
+    # Блокировка проверяется в общем кэше: локальная копия TwoTierCache
+    # показывала бы уже снятую блокировку до LOCAL_TIMEOUT секунд
+    locks = getattr(cache, 'shared', cache)
+    deadline = time.time() + lock_timeout
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None or locks.get(lock_key) is None:
+            return entry
+    return None
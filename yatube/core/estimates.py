@@ -0,0 +1,33 @@
+"""Оценка количества строк таблицы по статистике планировщика.
+
+Точный COUNT(*) на большой таблице читает весь индекс, а статистика,
+которую собирают ANALYZE (SQLite, PostgreSQL) и PRAGMA optimize,
+отдаёт примерное количество одним лёгким запросом.
+"""
+from django.db import DatabaseError, connections, router
+
+
+def estimated_rows(model):
+    """Примерное количество строк модели или None без статистики."""
+    using = router.db_for_read(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        # Первое число в stat - количество строк таблицы
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 появляется только после первого ANALYZE
+        return None
+    if row is None:
+        return None
+    rows = int(str(row[0]).split()[0])
+    # reltuples = -1 у ещё не проанализированной таблицы
+    return rows if rows >= 0 else None
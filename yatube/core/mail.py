@@ -0,0 +1,12 @@
+"""Отправка писем фоновой задачей."""
+from django.core.mail import EmailMultiAlternatives
+
+from .tasks import task
+
+
+@task
+def send_email(subject, body, from_email, recipients, html=None):
+    message = EmailMultiAlternatives(subject, body, from_email, recipients)
+    if html is not None:
+        message.attach_alternative(html, 'text/html')
+    message.send()
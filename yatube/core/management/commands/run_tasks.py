@@ -0,0 +1,91 @@
+import time
+from collections import Counter
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import claim_tasks, execute_task, purge_tasks
+
+# Результат задачи, обработчик которой упал: задача остаётся
+# выполняемой и после истечения аренды снова попадает в очередь
+CRASHED = 'crashed'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи фоновой очереди (core.tasks) в пуле потоков '
+        'или процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--processes', action='store_true',
+                            help='Пул процессов вместо пула потоков')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза в секундах, когда в очереди нет готовых задач'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться (для cron)'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        processes = options['processes']
+        purged = purge_tasks()
+        if purged:
+            self.stdout.write(f'Удалено старых задач: {purged}')
+        executor_class = (
+            ProcessPoolExecutor if processes else ThreadPoolExecutor
+        )
+        results = Counter()
+        running = set()
+        pool = executor_class(max_workers=workers)
+        try:
+            while True:
+                claimed = claim_tasks(workers - len(running))
+                if processes and claimed:
+                    # Дочерние процессы не должны наследовать
+                    # открытые соединения
+                    connections.close_all()
+                running.update(
+                    pool.submit(execute_task, pk) for pk in claimed
+                )
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, running = wait(
+                    running, timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED
+                )
+                if any(isinstance(future.exception(), BrokenProcessPool)
+                       for future in done):
+                    # Завершившийся процесс ломает весь пул: остальные
+                    # его задачи тоже завершаются ошибкой
+                    done |= wait(running).done
+                    running = set()
+                    pool.shutdown(wait=False)
+                    pool = executor_class(max_workers=workers)
+                results.update(self.result(future) for future in done)
+        except KeyboardInterrupt:
+            self.stderr.write('Остановка: ждём выполняемые задачи')
+        finally:
+            pool.shutdown()
+        results.update(self.result(future) for future in running)
+        self.stdout.write(', '.join(
+            f'{status}: {count}' for status, count in sorted(results.items())
+        ) or 'Нет готовых задач')
+
+    def result(self, future):
+        """Состояние задачи из future; сбой обработчика - CRASHED."""
+        try:
+            return future.result()
+        except Exception as error:
+            self.stderr.write(f'Сбой обработчика задачи: {error!r}')
+            return CRASHED
@@ -0,0 +1,225 @@
+"""Метрики в текстовом формате Prometheus.
+
+Значения счётчиков и гистограмм процесса хранятся в одном словаре под
+блокировкой, поэтому учёт события - одно сложение. Если задан
+METRICS_DIR, каждый процесс не чаще раза в METRICS_FLUSH_INTERVAL
+секунд записывает свои значения в файл <pid>.json этого каталога, а
+представление /metrics складывает файлы всех процессов: веб-сервера
+с несколькими процессами и обработчиков run_tasks. Файлы завершившихся
+процессов продолжают учитываться, чтобы счётчики не уменьшались;
+каталог очищается при перезапуске сервиса.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Границы гистограмм длительности в секундах
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        self._flushed = 0
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add(self, sample, labels, amount):
+        with self._lock:
+            self._values[sample, labels] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def flush(self, force=False):
+        """Записать значения процесса в METRICS_DIR."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (
+            not force and now - self._flushed < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        self._flushed = now
+        samples = [
+            [sample, list(labels), value]
+            for (sample, labels), value in self.snapshot().items()
+        ]
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        # Запись через временный файл: читатель не увидит половину файла
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as target:
+            json.dump(samples, target)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Значения всех процессов: {(имя, метки): значение}."""
+        values = defaultdict(float)
+        directory = settings.METRICS_DIR
+        own = f'{os.getpid()}.json'
+        if directory and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if not name.endswith('.json') or name == own:
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as source:
+                        samples = json.load(source)
+                except (OSError, ValueError):
+                    continue
+                for sample, labels, value in samples:
+                    values[sample, tuple(map(tuple, labels))] += value
+        for key, value in self.snapshot().items():
+            values[key] += value
+        return values
+
+    def render(self):
+        """Текст для Prometheus."""
+        values = self.collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def _labels(self, labels):
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _samples(self, values, sample):
+        return sorted(
+            (labels, value) for (name, labels), value in values.items()
+            if name == sample
+        )
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self._labels(labels), amount)
+
+    def render(self, values):
+        for labels, value in self._samples(values, self.name):
+            yield f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DURATION_BUCKETS, registry=registry):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # Хранится число наблюдений в каждом интервале, накопленные
+        # суммы для le считаются при выводе
+        for bound in self.buckets:
+            if value <= bound:
+                break
+        self.registry.add(
+            f'{self.name}_bucket', labels + (('le', bound),), 1
+        )
+        self.registry.add(f'{self.name}_sum', labels, value)
+        self.registry.add(f'{self.name}_count', labels, 1)
+
+    def render(self, values):
+        buckets = defaultdict(dict)
+        for labels, value in self._samples(values, f'{self.name}_bucket'):
+            *series, (_, bound) = labels
+            buckets[tuple(series)][float(bound)] = value
+        sums = dict(self._samples(values, f'{self.name}_sum'))
+        for series, counts in sorted(buckets.items()):
+            total = 0
+            for bound in self.buckets:
+                total += counts.get(bound, 0)
+                labels = series + (('le', _format_value(bound)),)
+                yield (f'{self.name}_bucket{_format_labels(labels)} '
+                       f'{_format_value(total)}')
+            yield (f'{self.name}_sum{_format_labels(series)} '
+                   f'{_format_value(sums.get(series, 0))}')
+            yield (f'{self.name}_count{_format_labels(series)} '
+                   f'{_format_value(total)}')
+
+
+REQUESTS = Counter(
+    'yatube_http_requests_total',
+    'Запросы по имени URL, методу и коду ответа',
+    ['view', 'method', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время обработки запроса по имени URL',
+    ['view']
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_http_request_db_queries',
+    'Количество SQL-запросов на запрос по имени URL',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100)
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к уровням TwoTierCache: hit или miss',
+    ['tier', 'result']
+)
+THUMBNAIL_DURATION = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время построения всех миниатюр одного изображения',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+TASKS = Counter(
+    'yatube_tasks_total',
+    'Выполненные фоновые задачи по функции и результату',
+    ['name', 'status']
+)
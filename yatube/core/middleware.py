@@ -0,0 +1,133 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics, routers, timings
+
+logger = logging.getLogger('core.performance')
+
+
+class MetricsMiddleware:
+    """Метрики каждого запроса для /metrics (core.metrics).
+
+    Запросы учитываются по имени URL, а не по пути, чтобы количество
+    рядов не зависело от количества постов и пользователей.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        metrics.REQUEST_DURATION.observe(duration, view=view)
+        metrics.REQUEST_QUERIES.observe(queries, view=view)
+        metrics.registry.flush()
+        return response
+
+
+class PerformanceMiddleware:
+    """Замер времени обработки запроса.
+
+    Для доли запросов PERFORMANCE_SAMPLE_RATE считает общее время,
+    количество и время SQL-запросов, время отрисовки шаблонов и
+    попадания в кэш. Результат добавляется в заголовок Server-Timing
+    и пишется одной JSON-строкой в лог core.performance.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+        request_timings = timings.RequestTimings()
+        token = timings.activate(request_timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_timings.sql_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            timings.deactivate(token)
+        total = time.perf_counter() - start
+        self.report(request, response, request_timings, total)
+        return response
+
+    def report(self, request, response, request_timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else None
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={request_timings.sql_time * 1000:.1f};'
+            f'desc="{request_timings.sql_count} queries"',
+            f'tpl;dur={request_timings.template_time * 1000:.1f}',
+            f'cache;desc="hits={request_timings.cache_hits} '
+            f'misses={request_timings.cache_misses}"',
+        ])
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'sql_count': request_timings.sql_count,
+            'sql_ms': round(request_timings.sql_time * 1000, 1),
+            'template_ms': round(request_timings.template_time * 1000, 1),
+            'cache_hits': request_timings.cache_hits,
+            'cache_misses': request_timings.cache_misses,
+        }))
+
+
+class ReadYourWritesMiddleware:
+    """Привязка чтений пользователя к основной базе после его записей.
+
+    Если запрос что-то записал, ответ ставит куку на
+    DATABASE_STICKY_SECONDS секунд; пока она есть, чтения этого
+    браузера не уходят на реплики, отстающие от основной базы.
+    """
+    cookie_name = 'db_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = routers.RoutingState(
+            use_primary=self.cookie_name in request.COOKIES
+        )
+        token = routers.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        if state.wrote:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.DATABASE_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
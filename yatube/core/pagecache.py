@@ -0,0 +1,111 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Отрисованный ответ сохраняется по адресу страницы вместе с поколениями
+(core.cache), от которых зависит её содержимое - это теги страницы.
+Сигналы моделей поднимают поколения изменившихся объектов, и все
+страницы с такими тегами перестают отдаваться из кэша без перебора
+ключей. Запросы с сессионной кукой и страницы с CSRF-формами в кэш
+не попадают.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .cache import generations_unchanged, get_generation, touch_generation
+from .routers import use_primary
+
+CACHE_HEADER = 'X-Page-Cache'
+# Общее поколение всех страниц: для изменений в обход сигналов
+SITE_GENERATION = 'site'
+
+
+def invalidate_site():
+    """Сбросить все страницы, например после массовой загрузки.
+
+    Поколение сайта входит в Last-Modified, поэтому поднимается до
+    текущего времени.
+    """
+    touch_generation(SITE_GENERATION)
+
+
+def add_cache_tags(request, *names):
+    """Связать страницу с поколениями names.
+
+    Поколения запоминаются в момент вызова, поэтому теги добавляются до
+    чтения данных страницы: изменение, пришедшее во время её отрисовки,
+    не будет сохранено в кэше под новым поколением.
+    """
+    tags = request.__dict__.get('_page_cache_tags')
+    if tags is None:
+        tags = request._page_cache_tags = {
+            SITE_GENERATION: get_generation(SITE_GENERATION)
+        }
+    for name in names:
+        if name not in tags:
+            tags[name] = get_generation(name)
+
+
+def _cache_key(request):
+    url = request.build_absolute_uri()
+    return 'pagecache:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def _is_cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # На странице есть CSRF-токен: он привязан к посетителю
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not response.has_header('Cache-Control')
+    )
+
+
+def cache_anonymous_page(view):
+    """Отдавать страницу анонимным посетителям из кэша.
+
+    Представление отмечает, от чего зависит страница, через
+    add_cache_tags; страница без тегов не кэшируется. Страница, которой
+    нет в кэше, строится по основной базе, а не по реплике.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+        key = _cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            generations, response = entry
+            if generations_unchanged(generations):
+                response[CACHE_HEADER] = 'hit'
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified')
+                    ),
+                    response=response,
+                )
+        with use_primary():
+            response = view(request, *args, **kwargs)
+            tags = getattr(request, '_page_cache_tags', None)
+            cacheable = tags and _is_cacheable_response(request, response)
+            if cacheable and hasattr(response, 'render'):
+                response.render()
+        if cacheable:
+            cache.set(key, (tags, response),
+                      settings.PAGE_CACHE_TIMEOUT)
+            response[CACHE_HEADER] = 'miss'
+        return response
+    return wrapper
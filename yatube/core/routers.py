@@ -0,0 +1,82 @@
+"""Маршрутизация запросов к основной базе и репликам для чтения.
+
+Чтения уходят на реплики из DATABASE_REPLICAS только внутри запроса,
+обработанного ReadYourWritesMiddleware: после первой записи в запросе
+и в течение DATABASE_STICKY_SECONDS после неё пользователь читает с
+основной базы и видит свои изменения. Команды и shell всегда работают
+с основной базой.
+
+Значения, которые сохраняются в общем кэше под текущим поколением
+данных, вычисляются внутри use_primary: отстающая реплика могла ещё не
+получить изменение, поднявшее поколение, и старые данные остались бы
+в кэше до следующего изменения.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_current = contextvars.ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_primary=False):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+def current():
+    return _current.get()
+
+
+def activate(state):
+    return _current.set(state)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Читать с основной базы внутри блока."""
+    state = current()
+    if state is None or state.use_primary:
+        yield
+        return
+    state.use_primary = True
+    try:
+        yield
+    finally:
+        # Запись внутри блока оставляет чтения на основной базе
+        state.use_primary = state.wrote
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = current()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or state.use_primary or not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = state.use_primary = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с данными
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
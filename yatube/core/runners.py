@@ -0,0 +1,20 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Запуск тестов с TASKS_EAGER: задачи выполняются при постановке.
+
+    Иначе задачи, отложенные до фиксации транзакции, в TestCase не
+    ставятся в очередь совсем. Отдельные тесты очереди выключают
+    TASKS_EAGER через override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.eager_tasks = override_settings(TASKS_EAGER=True)
+        self.eager_tasks.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.eager_tasks.disable()
+        super().teardown_test_environment(**kwargs)
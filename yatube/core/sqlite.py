@@ -0,0 +1,20 @@
+"""Настройка соединений с SQLite.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: журнал WAL
+позволяет читать во время записи, busy_timeout заставляет писателей
+ждать блокировку вместо ошибки «database is locked».
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
@@ -0,0 +1,223 @@
+"""Фоновые задачи без внешнего брокера.
+
+Очередь хранится в таблице core.Task. Функция, обёрнутая декоратором
+task, ставится в очередь методом delay() после фиксации транзакции, а
+выполняет её команда run_tasks в пуле потоков или процессов. Задача с
+ключом идемпотентности не ставится в очередь повторно, пока она ждёт
+или выполняется; после завершения ключ освобождается.
+Обработчик берёт задачу условным UPDATE с арендой на
+TASKS_LEASE_SECONDS, поэтому несколько обработчиков не выполняют её
+одновременно, а задачу упавшего обработчика после истечения аренды
+возьмёт другой; это тоже попытка, и после max_attempts таких попыток
+задача завершается ошибкой. Ошибка приводит к повтору с
+экспоненциальной задержкой.
+"""
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class TaskFunction:
+    """Функция, которую можно выполнить в фоне.
+
+    Прямой вызов выполняет её сразу; имя для очереди - путь импорта.
+    """
+
+    def __init__(self, func, max_attempts=None, retry_delay=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __reduce__(self):
+        # Для пула процессов функция передаётся по имени
+        return import_string, (self.name,)
+
+    def enqueue(self, *args, idempotency_key=None, run_at=None, **kwargs):
+        """Сразу добавить задачу в очередь текущей транзакции.
+
+        Если задача с таким ключом идемпотентности ждёт или выполняется,
+        возвращается она, а новая не создаётся.
+        """
+        arguments = json.dumps({'args': args, 'kwargs': kwargs})
+        fields = {
+            'name': self.name,
+            'arguments': arguments,
+            'max_attempts': (
+                self.max_attempts or settings.TASKS_MAX_ATTEMPTS
+            ),
+            'run_at': run_at or timezone.now(),
+        }
+        if idempotency_key is None:
+            return Task.objects.create(**fields)
+        try:
+            with transaction.atomic():
+                return Task.objects.create(
+                    idempotency_key=idempotency_key, **fields
+                )
+        except IntegrityError:
+            existing = Task.objects.filter(
+                idempotency_key=idempotency_key
+            ).first()
+            if existing is not None:
+                return existing
+            # Задача успела завершиться и освободить ключ
+            return Task.objects.create(
+                idempotency_key=idempotency_key, **fields
+            )
+
+    def delay(self, *args, **kwargs):
+        """Поставить задачу в очередь после фиксации транзакции.
+
+        При TASKS_EAGER задача выполняется сразу.
+        """
+        if settings.TASKS_EAGER:
+            kwargs.pop('idempotency_key', None)
+            kwargs.pop('run_at', None)
+            self(*args, **kwargs)
+            return
+        transaction.on_commit(lambda: self.enqueue(*args, **kwargs))
+
+
+def task(func=None, *, max_attempts=None, retry_delay=None):
+    """Декоратор фоновой задачи; параметры - для повторов при ошибке."""
+    def decorator(func):
+        return TaskFunction(func, max_attempts, retry_delay)
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def _ready(now):
+    # Задачи в очереди и задачи с истёкшей арендой, у которых остались
+    # попытки
+    return (
+        Q(status=Task.PENDING, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now,
+            attempts__lt=F('max_attempts'))
+    )
+
+
+def fail_abandoned_tasks(now):
+    """Завершить ошибкой задачи с истёкшей арендой без попыток.
+
+    Такая задача, скорее всего, сама завершает процесс обработчика:
+    повторять её бесконечно нельзя.
+    """
+    abandoned = Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts')
+    ).values_list('pk', 'name')
+    for pk, name in abandoned:
+        failed = Task.objects.filter(
+            pk=pk, status=Task.RUNNING, locked_until__lt=now
+        ).update(
+            status=Task.FAILED, locked_until=None, finished=now,
+            idempotency_key=None,
+            last_error='Обработчик не завершил задачу до истечения аренды'
+        )
+        if failed:
+            metrics.TASKS.inc(name=name, status=Task.FAILED)
+
+
+def claim_tasks(limit):
+    """Взять до limit готовых задач, вернуть их идентификаторы."""
+    now = timezone.now()
+    fail_abandoned_tasks(now)
+    candidates = list(
+        Task.objects.filter(_ready(now)).order_by('run_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    lease = now + timedelta(seconds=settings.TASKS_LEASE_SECONDS)
+    claimed = []
+    for pk in candidates:
+        # Задачу мог взять другой обработчик: условие проверяется снова
+        taken = Task.objects.filter(_ready(now), pk=pk).update(
+            status=Task.RUNNING, locked_until=lease,
+            attempts=F('attempts') + 1
+        )
+        if taken:
+            claimed.append(pk)
+    return claimed
+
+
+def retry_delay(task_function, attempts):
+    """Задержка перед повтором: удваивается с каждой попыткой."""
+    base = settings.TASKS_RETRY_DELAY
+    if task_function is not None and task_function.retry_delay:
+        base = task_function.retry_delay
+    delay = min(base * 2 ** (attempts - 1), settings.TASKS_MAX_RETRY_DELAY)
+    # Разброс, чтобы повторы после общего сбоя не совпадали
+    return delay * random.uniform(1, 1.1)
+
+
+def execute_task(pk):
+    """Выполнить взятую задачу и записать результат; вернуть состояние."""
+    try:
+        task = Task.objects.get(pk=pk)
+        task_function = None
+        try:
+            task_function = import_string(task.name)
+            arguments = json.loads(task.arguments)
+            task_function(*arguments['args'], **arguments['kwargs'])
+        except Exception:
+            logger.exception('Задача %s #%s завершилась ошибкой',
+                             task.name, pk)
+            error = traceback.format_exc()
+            if task.attempts < task.max_attempts:
+                status = Task.PENDING
+                run_at = timezone.now() + timedelta(
+                    seconds=retry_delay(task_function, task.attempts)
+                )
+                Task.objects.filter(pk=pk).update(
+                    status=status, run_at=run_at, locked_until=None,
+                    last_error=error
+                )
+            else:
+                status = Task.FAILED
+                Task.objects.filter(pk=pk).update(
+                    status=status, locked_until=None, last_error=error,
+                    finished=timezone.now(), idempotency_key=None
+                )
+            metrics.TASKS.inc(name=task.name, status=status)
+            return status
+        Task.objects.filter(pk=pk).update(
+            status=Task.DONE, locked_until=None, finished=timezone.now(),
+            idempotency_key=None
+        )
+        metrics.TASKS.inc(name=task.name, status=Task.DONE)
+        return Task.DONE
+    finally:
+        # Потоки и процессы пула не проходят через обработку запроса,
+        # поэтому соединения с базой закрываем сами. Процесс пула
+        # завершается без atexit: метрики записываем после каждой задачи.
+        connections.close_all()
+        metrics.registry.flush(force=True)
+
+
+def purge_tasks(days=None):
+    """Удалить завершённые задачи старше days дней, вернуть их число."""
+    if days is None:
+        days = settings.TASKS_RETENTION_DAYS
+    deleted, _ = Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED),
+        finished__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
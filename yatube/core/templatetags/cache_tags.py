@@ -0,0 +1,45 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import get_or_compute
+
+register = template.Library()
+
+
+class CacheOnceNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), int(timeout)
+        )
+
+
+@register.tag('cache_once')
+def do_cache_once(parser, token):
+    """Аналог {% cache %}, защищённый от одновременного пересчёта.
+
+    {% cache_once timeout name [vary_on ...] %} ... {% endcache_once %}
+    Фрагмент пересчитывает один запрос, остальные получают прежнюю
+    версию (core.cache.get_or_compute).
+    """
+    nodelist = parser.parse(('endcache_once',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает как минимум два аргумента'
+        )
+    return CacheOnceNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,49 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: края и окно вокруг текущей.
+
+    Пропуски обозначаются None, поэтому размер списка не зависит
+    от общего количества страниц. Если количество примерное, номера
+    последних страниц не показываются.
+    """
+    num_pages = page_obj.paginator.num_pages
+    approximate = getattr(page_obj.paginator, 'approximate', False)
+    number = page_obj.number
+    window = set(range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1
+    ))
+    window.update(range(1, min(on_ends, num_pages) + 1))
+    if not approximate:
+        window.update(
+            range(max(num_pages - on_ends + 1, 1), num_pages + 1)
+        )
+    pages = []
+    previous = 0
+    for i in sorted(window):
+        if i - previous > 1:
+            pages.append(None)
+        pages.append(i)
+        previous = i
+    if approximate and previous < num_pages:
+        pages.append(None)
+    return pages
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **kwargs):
+    """Строка запроса текущей страницы с новыми параметрами пагинации.
+
+    Остальные параметры (например, search) сохраняются.
+    """
+    query = context['request'].GET.copy()
+    for key in ('page', 'cursor'):
+        query.pop(key, None)
+    for key, value in kwargs.items():
+        query[key] = value
+    return query.urlencode()
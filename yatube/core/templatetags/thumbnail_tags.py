@@ -0,0 +1,65 @@
+import logging
+
+from django import template
+from core.thumbnails import (built_thumbnail, is_pending,
+                             schedule_thumbnails, thumbnail_formats,
+                             thumbnail_variants)
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+MIME_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+
+@register.inclusion_tag('includes/picture.html')
+def responsive_image(image, alt='', sizes='(max-width: 960px) 100vw, 960px',
+                     css_class='card-img my-2'):
+    """<picture> с srcset нескольких ширин в каждом формате миниатюр.
+
+    Последний формат из THUMBNAIL_SRCSET_FORMATS используется в <img>
+    как запасной вариант для браузеров без поддержки остальных.
+    Миниатюры только читаются из хранилища sorl: если какой-то нет,
+    выводится заглушка, а построение ставится в фоновую очередь.
+    """
+    if not image:
+        return {}
+    context = {'alt': alt, 'sizes': sizes, 'css_class': css_class}
+    sources = []
+    missing = is_pending(image.name)
+    try:
+        for image_format in thumbnail_formats():
+            srcset = []
+            for width, height, options in thumbnail_variants(image_format):
+                thumbnail = None if missing else built_thumbnail(
+                    image, **options)
+                if thumbnail is None:
+                    missing = True
+                    continue
+                srcset.append(f'{thumbnail.url} {width}w')
+            # Размеры известны из геометрии: crop и upscale дают их точно
+            sources.append({
+                'type': MIME_TYPES.get(image_format, ''),
+                'srcset': ', '.join(srcset),
+                'url': thumbnail and thumbnail.url,
+                'width': width,
+                'height': height,
+            })
+        if missing and not is_pending(image.name):
+            schedule_thumbnails(image.name)
+    except Exception:
+        # Как и тег thumbnail из sorl, не ломаем страницу из-за картинки
+        logger.exception('Не удалось получить миниатюры для %s', image)
+        return {}
+    if not sources:
+        return {}
+    if missing:
+        context['placeholder'] = sources[-1]
+        return context
+    context['sources'] = sources[:-1]
+    context['fallback'] = sources[-1]
+    return context
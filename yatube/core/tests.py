@@ -1,9 +1,54 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.paginator import Paginator
+import json
+import os
+import tempfile
+from io import StringIO
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         Client, RequestFactory, override_settings)
 from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from . import routers
+from .backends.cache import TwoTierCache
+from .middleware import ReadYourWritesMiddleware
+from .cache import (_wait_for, bump_generation, generation_time,
+                    get_generation, get_or_compute, touch_generation)
+from .estimates import estimated_rows
+from .metrics import Counter, Histogram, Registry
+from .models import Task
+from .tasks import claim_tasks, task
+from .sqlite import pragma_statements
+from .pagecache import add_cache_tags, cache_anonymous_page, invalidate_site
+from .templatetags.paginator_tags import page_window
 
 
 User = get_user_model()
 
+# Вызовы задач для TaskQueueTests: задачи должны импортироваться по имени
+task_calls = []
+
+
+@task
+def remember(value):
+    task_calls.append(value)
+
+
+@task(max_attempts=2, retry_delay=60)
+def always_fails():
+    raise ValueError('Сбой задачи')
+
 
 class PagesURLTests(TestCase):
 
@@ -17,3 +62,524 @@ class PagesURLTests(TestCase):
         """Проверка, что страница 404 отдает кастомный шаблон."""
         response = self.guest_client.get('/core/404/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PageWindowTests(SimpleTestCase):
+
+    def test_window_is_bounded(self):
+        """Окно страниц не растёт вместе с количеством страниц."""
+        page_obj = Paginator(range(500000), 10).page(25000)
+        self.assertEqual(
+            page_window(page_obj),
+            [1, None, 24998, 24999, 25000, 25001, 25002, None, 50000]
+        )
+
+    def test_window_without_gaps(self):
+        """Для нескольких страниц многоточия не выводятся."""
+        page_obj = Paginator(range(40), 10).page(2)
+        self.assertEqual(page_window(page_obj), [1, 2, 3, 4])
+
+    def test_window_at_first_page(self):
+        page_obj = Paginator(range(1000), 10).page(1)
+        self.assertEqual(page_window(page_obj), [1, 2, 3, None, 100])
+
+    def test_window_for_approximate_count(self):
+        """При примерном количестве последняя страница не выводится."""
+        paginator = Paginator(range(1000), 10)
+        paginator.approximate = True
+        self.assertEqual(
+            page_window(paginator.page(1)), [1, 2, 3, None]
+        )
+        self.assertEqual(
+            page_window(paginator.page(100)), [1, None, 98, 99, 100]
+        )
+
+
+class GenerationTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generation_is_stable_until_bumped(self):
+        generation = get_generation('test')
+        self.assertEqual(get_generation('test'), generation)
+        bump_generation('test')
+        self.assertNotEqual(get_generation('test'), generation)
+
+    def test_bump_without_generation(self):
+        """Сброс работает и для ещё не созданного поколения."""
+        generation = bump_generation('missing')
+        self.assertEqual(get_generation('missing'), generation)
+
+    def test_touch_is_monotonic_timestamp(self):
+        before = get_generation('test')
+        first = touch_generation('test')
+        second = touch_generation('test')
+        self.assertGreater(first, before)
+        self.assertGreater(second, first)
+        self.assertEqual(generation_time(second).year,
+                         generation_time(before).year)
+
+
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_computed_once(self):
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_value_recomputed_by_lock_holder(self):
+        cache.set('key', ('old', time.time() - 1, 0), 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_stale_value_while_locked(self):
+        """Пока значение пересчитывает другой запрос, отдаётся старое."""
+        cache.set('key', ('old', time.time() - 1, 0), 60)
+        cache.add('key:lock', True)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    def test_missing_value_waits_for_lock(self):
+        cache.add('key:lock', True)
+        value = get_or_compute('key', self.compute, 60, lock_timeout=0.1)
+        self.assertEqual(value, 1)
+
+    def test_released_lock_seen_through_local_copy(self):
+        """Снятая в другом процессе блокировка не ждёт LOCAL_TIMEOUT."""
+        cache.add('key:lock', True)
+        caches['shared'].delete('key:lock')
+        start = time.monotonic()
+        self.assertIsNone(_wait_for('key', 'key:lock', lock_timeout=2))
+        self.assertLess(time.monotonic() - start, 1)
+
+    @mock.patch('core.cache.random.random', return_value=0.5)
+    def test_early_recomputation(self, random):
+        """Дорогое значение пересчитывается до истечения срока."""
+        cache.set('key', ('old', time.time() + 10, 100), 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        cache.set('key', ('old', time.time() + 10, 0.001), 60)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'old')
+
+
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+
+    def make_cache(self, **options):
+        """Кэш отдельного процесса поверх общего кэша shared."""
+        options = {'SHARED_CACHE': 'shared', 'EPOCH_INTERVAL': 0, **options}
+        return TwoTierCache('', {'OPTIONS': options})
+
+    def test_reads_go_local_after_first_miss(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 'value')
+        self.assertEqual(second.get('key'), 'value')
+        self.assertEqual(second.get('key'), 'value')
+        self.assertIsNone(second.get('missing'))
+        stats = second.stats()
+        self.assertEqual(stats['local'], {'hits': 1, 'misses': 2,
+                                          'ratio': 1 / 3})
+        self.assertEqual(stats['shared']['hits'], 1)
+        self.assertEqual(stats['shared']['misses'], 1)
+
+    def test_invalidate_local_reaches_other_processes(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 'old')
+        second.get('key')
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'old')
+        first.invalidate_local()
+        self.assertEqual(second.get('key'), 'new')
+
+    def test_local_copy_expires(self):
+        first = self.make_cache(LOCAL_TIMEOUT=0.01)
+        first.set('key', 'value')
+        time.sleep(0.02)
+        self.assertEqual(first.get('key'), 'value')
+        self.assertEqual(first.stats()['shared']['hits'], 1)
+
+    def test_eviction_by_entries_and_size(self):
+        first = self.make_cache(MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            first.set(key, key)
+        self.assertEqual(first.stats()['entries'], 2)
+        first.get('a')
+        self.assertEqual(first.stats()['local']['hits'], 0)
+        small = self.make_cache(LOCAL_MAX_BYTES=100)
+        small.set('big', 'x' * 200)
+        self.assertEqual(small.stats()['entries'], 0)
+        self.assertEqual(small.get('big'), 'x' * 200)
+
+    def test_incr_uses_shared_value(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set('counter', 1)
+        second.get('counter')
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(second.incr('counter'), 3)
+        self.assertEqual(second.get('counter'), 3)
+        self.assertTrue(first.add('new', 1))
+        self.assertFalse(second.add('new', 2))
+
+
+@cache_anonymous_page
+def tagged_view(request):
+    add_cache_tags(request, 'test')
+    if 'csrf' in request.GET:
+        return HttpResponse(get_token(request))
+    if 'racing' in request.GET:
+        # Данные меняются, пока страница строится
+        bump_generation('test')
+    return HttpResponse('ok')
+
+
+class PageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def get(self, path='/', **kwargs):
+        return tagged_view(self.factory.get(path, **kwargs))
+
+    def test_page_cached_until_tag_changes(self):
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+        bump_generation('test')
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+        invalidate_site()
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+
+    def test_change_during_render_not_cached_as_fresh(self):
+        self.assertEqual(self.get('/?racing=1')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get('/?racing=1')['X-Page-Cache'], 'miss')
+
+    def test_query_string_is_part_of_key(self):
+        self.get('/?page=1')
+        self.assertEqual(self.get('/?page=2')['X-Page-Cache'], 'miss')
+
+    def test_session_and_csrf_bypass(self):
+        self.get()
+        response = self.get(HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}=x')
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.get('/?csrf=1')
+        self.assertFalse(self.get('/?csrf=1').has_header('X-Page-Cache'))
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1)
+    def test_server_timing_header_and_log(self):
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        self.assertIn('total;dur=', header)
+        self.assertIn('tpl;dur=', header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['sql_count'], 0)
+        self.assertIn(f'desc="{record["sql_count"]} queries"', header)
+        # Поколение кэша и фрагмент ленты ещё не закэшированы
+        self.assertGreater(record['cache_misses'], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1)
+    def test_cache_hits_counted(self):
+        self.client.get(reverse('posts:index'))
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['cache_hits'], 0)
+        self.assertEqual(record['cache_misses'], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_not_sampled_request(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadYourWritesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, request, write=False):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(User))
+            if write:
+                self.router.db_for_write(User)
+                reads.append(self.router.db_for_read(User))
+            return HttpResponse()
+        response = ReadYourWritesMiddleware(view)(request)
+        return response, reads
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_write_sticks_reads_to_primary(self):
+        response, reads = self.handle(self.factory.get('/'))
+        self.assertEqual(reads, ['replica'])
+        self.assertNotIn(ReadYourWritesMiddleware.cookie_name,
+                         response.cookies)
+        response, reads = self.handle(self.factory.post('/'), write=True)
+        self.assertEqual(reads, ['replica', 'default'])
+        cookie = response.cookies[ReadYourWritesMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_STICKY_SECONDS)
+        request = self.factory.get('/')
+        request.COOKIES[cookie.key] = cookie.value
+        self.assertEqual(self.handle(request)[1], ['default'])
+
+    def lagging_view(self, request):
+        """Страница по данным из кэша под поколением 'test'.
+
+        Реплика отстаёт: изменение, поднявшее поколение, на ней ещё
+        не видно.
+        """
+        rows = {'replica': 'old', 'default': 'new'}
+        add_cache_tags(request, 'test')
+        key = f'lagging:{get_generation("test")}'
+        body = get_or_compute(
+            key, lambda: rows[self.router.db_for_read(User)], 60
+        )
+        body += rows[self.router.db_for_read(User)]
+        return HttpResponse(body)
+
+    def test_cache_filled_from_primary_after_bump(self):
+        cache.clear()
+        view = ReadYourWritesMiddleware(
+            cache_anonymous_page(self.lagging_view)
+        )
+        view(self.factory.get('/'))
+        bump_generation('test')
+        # Страница вне кэша читает реплику, а фрагмент - основную базу
+        session = f'{settings.SESSION_COOKIE_NAME}=x'
+        response = view(self.factory.get('/', HTTP_COOKIE=session))
+        self.assertEqual(response.content, b'newold')
+        response = view(self.factory.get('/'))
+        self.assertEqual(response.content, b'newnew')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(view(self.factory.get('/')).content, b'newnew')
+
+    def test_use_primary_keeps_write_stickiness(self):
+        state = routers.RoutingState()
+        token = routers.activate(state)
+        try:
+            with routers.use_primary():
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+            with routers.use_primary():
+                self.router.db_for_write(User)
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        finally:
+            routers.deactivate(token)
+
+    def test_replicas_do_not_migrate(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+class SQLitePragmaTests(TestCase):
+
+    def test_connection_configured(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_pragma_statements(self):
+        self.assertEqual(
+            pragma_statements({'journal_mode': 'WAL', 'cache_size': -1}),
+            ['PRAGMA journal_mode = WAL', 'PRAGMA cache_size = -1']
+        )
+
+
+class SQLiteMaintenanceTests(TransactionTestCase):
+    """Контрольная точка WAL невозможна внутри транзакции TestCase."""
+
+    def test_maintenance_command(self):
+        stdout = StringIO()
+        call_command('sqlite_maintenance', stdout=stdout)
+        self.assertIn('Обслуживание завершено', stdout.getvalue())
+
+
+class EstimatedRowsTests(TestCase):
+
+    def test_rows_from_planner_statistics(self):
+        User.objects.bulk_create(
+            User(username=f'user_{i}') for i in range(5)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS sqlite_stat1')
+        self.assertIsNone(estimated_rows(User))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_rows(User), 5)
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTests(TransactionTestCase):
+
+    def setUp(self):
+        task_calls.clear()
+
+    def run_tasks(self):
+        call_command('run_tasks', once=True, workers=1, stdout=StringIO())
+
+    def test_delayed_task_runs_in_worker(self):
+        remember.delay('первый')
+        self.assertEqual(task_calls, [])
+        self.run_tasks()
+        self.assertEqual(task_calls, ['первый'])
+        task_record = Task.objects.get()
+        self.assertEqual(task_record.name, 'core.tests.remember')
+        self.assertEqual(task_record.status, Task.DONE)
+        self.assertEqual(task_record.attempts, 1)
+
+    def test_idempotency_key_enqueues_once(self):
+        for _ in range(2):
+            remember.delay('один раз', idempotency_key='remember:1')
+        self.assertEqual(Task.objects.count(), 1)
+        self.run_tasks()
+        self.assertEqual(task_calls, ['один раз'])
+
+    def test_idempotency_key_released_after_task_ends(self):
+        record = always_fails.enqueue(idempotency_key='fails:1')
+        Task.objects.update(max_attempts=1)
+        self.run_tasks()
+        record.refresh_from_db()
+        self.assertEqual(record.status, Task.FAILED)
+        retry = always_fails.enqueue(idempotency_key='fails:1')
+        self.assertNotEqual(retry.pk, record.pk)
+        self.assertEqual(retry.status, Task.PENDING)
+        remember.enqueue('готово', idempotency_key='remember:2')
+        self.run_tasks()
+        remember.enqueue('снова', idempotency_key='remember:2')
+        self.run_tasks()
+        self.assertEqual(task_calls, ['готово', 'снова'])
+
+    def test_failed_task_retried_with_backoff(self):
+        record = always_fails.enqueue()
+        self.run_tasks()
+        record.refresh_from_db()
+        self.assertEqual(record.status, Task.PENDING)
+        self.assertEqual(record.attempts, 1)
+        self.assertIn('Сбой задачи', record.last_error)
+        self.assertGreater(
+            record.run_at, timezone.now() + timedelta(seconds=50))
+        # Повтор ещё не наступил
+        self.run_tasks()
+        record.refresh_from_db()
+        self.assertEqual(record.attempts, 1)
+        Task.objects.update(run_at=timezone.now())
+        self.run_tasks()
+        record.refresh_from_db()
+        self.assertEqual(record.status, Task.FAILED)
+        self.assertEqual(record.attempts, 2)
+
+    def test_expired_lease_is_claimed_again(self):
+        record = remember.enqueue('снова')
+        self.assertEqual(claim_tasks(10), [record.pk])
+        self.assertEqual(claim_tasks(10), [])
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(claim_tasks(10), [record.pk])
+
+    def test_abandoned_task_fails_after_max_attempts(self):
+        record = remember.enqueue('падает вместе с обработчиком')
+        Task.objects.update(
+            status=Task.RUNNING, attempts=record.max_attempts,
+            locked_until=timezone.now() - timedelta(1)
+        )
+        self.run_tasks()
+        record.refresh_from_db()
+        self.assertEqual(record.status, Task.FAILED)
+        self.assertIn('аренды', record.last_error)
+        self.assertEqual(task_calls, [])
+
+    @mock.patch('core.management.commands.run_tasks.execute_task',
+                side_effect=BrokenProcessPool)
+    def test_crashed_worker_does_not_stop_command(self, execute):
+        remember.enqueue('в упавшем процессе')
+        stdout, stderr = StringIO(), StringIO()
+        call_command('run_tasks', once=True, workers=1, stdout=stdout,
+                     stderr=stderr)
+        self.assertIn('crashed: 1', stdout.getvalue())
+        self.assertIn('BrokenProcessPool', stderr.getvalue())
+        self.assertEqual(Task.objects.get().status, Task.RUNNING)
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.requests = Counter('test_requests_total', 'Запросы',
+                                ['view'], registry=self.registry)
+        self.duration = Histogram('test_duration_seconds', 'Время',
+                                  buckets=(0.1, 1), registry=self.registry)
+
+    def test_text_format(self):
+        self.requests.inc(view='posts:index')
+        self.requests.inc(2, view='posts:index')
+        for value in (0.05, 0.5, 5):
+            self.duration.observe(value)
+        text = self.registry.render()
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{view="posts:index"} 3.0', text)
+        self.assertIn('# TYPE test_duration_seconds histogram', text)
+        self.assertIn('test_duration_seconds_bucket{le="0.1"} 1.0', text)
+        self.assertIn('test_duration_seconds_bucket{le="1.0"} 2.0', text)
+        self.assertIn('test_duration_seconds_bucket{le="+Inf"} 3.0', text)
+        self.assertIn('test_duration_seconds_sum 5.55', text)
+        self.assertIn('test_duration_seconds_count 3.0', text)
+
+    def test_values_of_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(METRICS_DIR=directory):
+                self.requests.inc(view='posts:index')
+                self.duration.observe(0.5)
+                self.registry.flush(force=True)
+                # Файл другого процесса
+                os.rename(os.path.join(directory, f'{os.getpid()}.json'),
+                          os.path.join(directory, '1.json'))
+                self.requests.inc(view='posts:index')
+                text = self.registry.render()
+        self.assertIn('test_requests_total{view="posts:index"} 3.0', text)
+        self.assertIn('test_duration_seconds_count 2.0', text)
+
+
+class MetricsViewTests(TestCase):
+
+    def test_requests_counted_by_url_name(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_http_requests_total{view="posts:index",method="GET",'
+            'status="200"}', text)
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"}', text)
+        self.assertIn('yatube_cache_requests_total{tier="local"', text)
+
+    def test_metrics_hidden_from_other_addresses(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,101 @@
+"""Генерация миниатюр изображений вне обработки запроса.
+
+После загрузки изображения миниатюры всех размеров и форматов для srcset
+строит фоновая задача. Пока они не готовы, шаблоны показывают
+заглушку вместо синхронной генерации.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import metrics
+from .cache import get_generation, touch_generation
+from .tasks import task
+
+# Если фоновая генерация не завершилась за это время, следующая
+# отрисовка страницы без готовых миниатюр ставит её в очередь заново.
+PENDING_TIMEOUT = 60 * 10
+
+# Поколение меняется, когда готовы очередные миниатюры: страницы с
+# заглушками перестают считаться неизменившимися.
+THUMBNAILS_GENERATION = 'thumbnails'
+
+
+def thumbnails_generation():
+    return get_generation(THUMBNAILS_GENERATION)
+
+
+def _pending_key(name):
+    return f'thumbnail:pending:{name}'
+
+
+def is_pending(name):
+    return bool(name) and cache.get(_pending_key(name), False)
+
+
+def thumbnail_formats():
+    """Форматы миниатюр; WebP - только если Pillow умеет его сохранять."""
+    return [
+        image_format for image_format in settings.THUMBNAIL_SRCSET_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def thumbnail_variants(image_format):
+    """Ширина, высота и параметры sorl миниатюр формата image_format."""
+    for width in settings.THUMBNAIL_SRCSET_WIDTHS:
+        height = round(width * settings.THUMBNAIL_SRCSET_RATIO)
+        yield width, height, {
+            'geometry_string': f'{width}x{height}',
+            'crop': 'center',
+            'upscale': True,
+            'format': image_format,
+        }
+
+
+def built_thumbnail(file_, geometry_string, **options):
+    """Готовая миниатюра из хранилища ключей sorl или None.
+
+    В отличие от get_thumbnail никогда не строит миниатюру. Параметры
+    дополняются так же, как в ThumbnailBackend.get_thumbnail, чтобы имя
+    файла совпало с построенным фоновой задачей.
+    """
+    backend = default.backend
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    source = ImageFile(file_)
+    name = backend._get_thumbnail_filename(source, geometry_string, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+@task(max_attempts=3)
+def generate_thumbnails(name):
+    """Построить миниатюры всех размеров и форматов для файла name."""
+    start = time.perf_counter()
+    try:
+        for image_format in thumbnail_formats():
+            for _, _, options in thumbnail_variants(image_format):
+                get_thumbnail(name, **options)
+        metrics.THUMBNAIL_DURATION.observe(time.perf_counter() - start)
+    finally:
+        cache.delete(_pending_key(name))
+        touch_generation(THUMBNAILS_GENERATION)
+
+
+def schedule_thumbnails(name):
+    """Поставить генерацию миниатюр в очередь после фиксации транзакции.
+
+    При TASKS_EAGER миниатюры строятся сразу.
+    """
+    cache.set(_pending_key(name), True, PENDING_TIMEOUT)
+    generate_thumbnails.delay(name, idempotency_key=f'thumbnails:{name}')
@@ -0,0 +1,39 @@
+"""Сбор времени выполнения запроса: SQL, шаблоны и кэш.
+
+Данные копятся в объекте RequestTimings, доступном через current()
+только пока запрос обрабатывается под PerformanceMiddleware.
+"""
+import contextvars
+import time
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+
+
+def current():
+    return _current.get()
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
@@ -0,0 +1,12 @@
+from core.cache import bump_generation, get_generation
+
+# Поколение кэша лент: меняется при изменении постов, групп и комментариев
+FEED_GENERATION = 'feed'
+
+
+def feed_generation():
+    return get_generation(FEED_GENERATION)
+
+
+def invalidate_feeds():
+    return bump_generation(FEED_GENERATION)
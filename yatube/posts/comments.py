@@ -0,0 +1,42 @@
+"""Комментарии к посту: страницы по курсору и кэшированное количество."""
+from django.conf import settings
+
+from core.cache import get_generation, get_or_compute
+
+from .conditional import POST, version_name
+from .models import Comment
+from .paginators import COMMENTS_PER_PAGE, CommentCursorPaginator
+
+
+def comments_page(post_id, cursor=None):
+    """Страница комментариев поста, начиная с самых новых."""
+    paginator = CommentCursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PER_PAGE
+    )
+    return paginator.get_page(cursor)
+
+
+def comments_count(post_id):
+    """Количество комментариев поста.
+
+    Ключ включает версию поста, которую сигналы поднимают при каждом
+    добавлении и удалении комментария, поэтому COUNT(*) выполняется
+    только после изменений.
+    """
+    key = 'comments:count:{}:{}'.format(
+        post_id, get_generation(version_name(POST, post_id))
+    )
+    return get_or_compute(
+        key, lambda: Comment.objects.filter(post_id=post_id).count(),
+        settings.FEED_CACHE_TIMEOUT
+    )
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
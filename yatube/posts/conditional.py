@@ -0,0 +1,142 @@
+"""Валидаторы условных GET-запросов для страниц поста, автора и группы.
+
+У поста, пользователя и группы есть версия - поколение в кэше, которое
+сигналы поднимают до текущего времени при каждом изменении. Поэтому
+версия служит и для ETag, и для Last-Modified, а проверка валидаторов
+стоит один лёгкий запрос вместо выполнения представления и шаблона.
+"""
+import hashlib
+
+from django.db.models import Max
+
+from core.cache import generation_time, get_generation, touch_generation
+from core.pagecache import SITE_GENERATION
+from core.thumbnails import THUMBNAILS_GENERATION
+
+from .models import Group, Post, User
+
+POST, USER, GROUP = 'post', 'user', 'group'
+# Меняется при изменении любой группы: её название есть в списках постов
+GROUPS_GENERATION = 'groups'
+
+
+def version_name(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def post_generations(post_id, author_id):
+    """Поколения, от которых зависит страница поста."""
+    return [
+        version_name(POST, post_id),
+        version_name(USER, author_id),
+        GROUPS_GENERATION,
+        THUMBNAILS_GENERATION,
+        SITE_GENERATION,
+    ]
+
+
+def list_generations(kind, pk):
+    """Поколения, от которых зависит лента автора или группы."""
+    return [
+        version_name(kind, pk),
+        GROUPS_GENERATION,
+        THUMBNAILS_GENERATION,
+        SITE_GENERATION,
+    ]
+
+
+def touch(kind, pk):
+    """Отметить изменение объекта; pk = None игнорируется."""
+    if pk is not None:
+        touch_generation(version_name(kind, pk))
+
+
+def touch_groups():
+    touch_generation(GROUPS_GENERATION)
+
+
+def _memoized(request, key, compute):
+    # etag_func и last_modified_func вызываются для одного запроса
+    # по очереди, состояние объекта достаточно получить один раз.
+    state = request.__dict__.setdefault('_conditional_state', {})
+    if key not in state:
+        state[key] = compute()
+    return state[key]
+
+
+def _etag(request, versions):
+    parts = [*versions, request.user.pk, request.get_full_path()]
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+
+
+def _last_modified(request, versions, dates=()):
+    # Страница авторизованного пользователя отличается от гостевой, а
+    # If-Modified-Since этого не учитывает: для них хватает ETag.
+    if request.user.is_authenticated:
+        return None
+    return max(
+        [generation_time(version) for version in versions]
+        + [date for date in dates if date is not None]
+    )
+
+
+def _post_state(request, post_id):
+    def compute():
+        post = Post.objects.filter(pk=post_id).values(
+            'author_id', 'group_id', 'pub_date'
+        ).annotate(last_comment=Max('comments__created')).first()
+        if post is None:
+            return None
+        post['versions'] = [
+            get_generation(name)
+            for name in post_generations(post_id, post['author_id'])
+        ]
+        return post
+    return _memoized(request, (POST, post_id), compute)
+
+
+def post_detail_etag(request, post_id):
+    post = _post_state(request, post_id)
+    return post and _etag(request, post['versions'])
+
+
+def post_detail_last_modified(request, post_id):
+    post = _post_state(request, post_id)
+    return post and _last_modified(
+        request, post['versions'], (post['pub_date'], post['last_comment'])
+    )
+
+
+def _list_state(request, kind, model, lookup):
+    def compute():
+        pk = model.objects.filter(**lookup).values_list(
+            'pk', flat=True
+        ).first()
+        if pk is None:
+            return None
+        return [
+            get_generation(name) for name in list_generations(kind, pk)
+        ]
+    return _memoized(request, (kind, tuple(lookup.items())), compute)
+
+
+def profile_etag(request, username):
+    versions = _list_state(request, USER, User, {'username': username})
+    return versions and _etag(request, versions)
+
+
+def profile_last_modified(request, username):
+    versions = _list_state(request, USER, User, {'username': username})
+    return versions and _last_modified(request, versions)
+
+
+def group_etag(request, slug):
+    versions = _list_state(request, GROUP, Group, {'slug': slug})
+    return versions and _etag(request, versions)
+
+
+def group_last_modified(request, slug):
+    versions = _list_state(request, GROUP, Group, {'slug': slug})
+    return versions and _last_modified(request, versions)
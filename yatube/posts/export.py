@@ -0,0 +1,96 @@
+"""Потоковая выгрузка постов и комментариев в NDJSON и CSV.
+
+Строки читаются через queryset.iterator(chunk_size) и сразу
+превращаются в текст, поэтому память не зависит от размера таблиц.
+"""
+import csv
+import json
+
+from .models import Comment, Post
+
+# Поля выгрузки: имя в файле -> путь в ORM
+FIELDS = {
+    'posts': {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    },
+    'comments': {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_SIZE = 2000
+
+
+def export_rows(kind, author=None, group=None, since=None, until=None,
+                chunk_size=CHUNK_SIZE):
+    """Словари выгружаемых строк, отфильтрованные и упорядоченные по id."""
+    if kind == 'posts':
+        queryset, date, group_lookup = Post.objects, 'pub_date', 'group'
+    else:
+        queryset, date = Comment.objects, 'created'
+        group_lookup = 'post__group'
+    filters = {}
+    if author:
+        filters['author__username'] = author
+    if group:
+        filters[f'{group_lookup}__slug'] = group
+    if since:
+        filters[f'{date}__gte'] = since
+    if until:
+        filters[f'{date}__lt'] = until
+    fields = FIELDS[kind]
+    rows = queryset.filter(**filters).order_by('pk').values_list(
+        *fields.values()
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, row))
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(
+            {key: _serialize(value) for key, value in row.items()},
+            ensure_ascii=False
+        ) + '\n'
+
+
+class _Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(kind, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS[kind])
+    for row in rows:
+        yield writer.writerow(
+            '' if value is None else _serialize(value)
+            for value in row.values()
+        )
+
+
+def export_lines(kind, export_format, **filters):
+    rows = export_rows(kind, **filters)
+    if export_format == 'csv':
+        return csv_lines(kind, rows)
+    return ndjson_lines(rows)
@@ -27,3 +27,18 @@ class CommentForm(forms.ModelForm):
                 'rows': 10,
             }),
         }
+
+
+class ExportFilterForm(forms.Form):
+    """Фильтры выгрузки постов и комментариев."""
+    author = forms.CharField(required=False)
+    group = forms.SlugField(required=False)
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and since > until:
+            raise forms.ValidationError('Начало периода позже его конца')
+        return cleaned_data
@@ -0,0 +1,130 @@
+"""Рейтинг «горячих» постов.
+
+Вес поста - сумма весов событий (комментариев к посту и подписок на
+его автора), каждый из которых затухает вдвое за HOT_HALF_LIFE секунд.
+В hot_score хранится логарифм суммы, приведённой к моменту EPOCH:
+ln(Σ w·e^((t - EPOCH)/τ)). Текущий вес отличается от неё общим для
+всех постов множителем, поэтому сортировка по столбцу совпадает с
+сортировкой по текущему весу, и хранимые значения не нужно уменьшать
+со временем. Событие изменяет одну строку атомарным UPDATE, а команда
+decay_hot_scores убирает из ленты только остывшие посты.
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from core.cache import bump_generation, get_generation
+
+from .models import Comment, Post
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Поколение кэша ленты «горячих» постов: меняется при изменении рейтинга
+HOT_GENERATION = 'hot'
+
+
+def hot_generation():
+    return get_generation(HOT_GENERATION)
+
+
+def event_score(weight, when):
+    """Логарифм веса события, приведённого к моменту EPOCH."""
+    tau = settings.HOT_HALF_LIFE / math.log(2)
+    return math.log(weight) + (when - EPOCH).total_seconds() / tau
+
+
+def current_weight(hot_score, now=None):
+    """Текущий вес поста по значению hot_score."""
+    return math.exp(hot_score - event_score(1, now or timezone.now()))
+
+
+def _logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def add_event(queryset, weight, when=None):
+    """Добавить событие с весом weight к постам queryset."""
+    event = Value(event_score(weight, when or timezone.now()))
+    score = F('hot_score')
+    # ln(e^a + e^b) = max(a, b) + ln(1 + e^-|a - b|) без переполнения
+    updated = queryset.update(hot_score=Case(
+        When(hot_score__isnull=True, then=event),
+        default=Greatest(score, event) + Ln(
+            Value(1.0) + Exp(-Abs(score - event))
+        ),
+        output_field=FloatField(),
+    ))
+    if updated:
+        bump_generation(HOT_GENERATION)
+    return updated
+
+
+def post_commented(comment):
+    return add_event(
+        Post.objects.filter(pk=comment.post_id),
+        settings.HOT_COMMENT_WEIGHT, comment.created
+    )
+
+
+def author_followed(author_id, now=None):
+    """Поднять недавние посты автора, на которого подписались."""
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.HOT_FOLLOW_WINDOW_DAYS)
+    return add_event(
+        Post.objects.filter(author_id=author_id, pub_date__gte=since),
+        settings.HOT_FOLLOW_WEIGHT, now
+    )
+
+
+def hot_posts():
+    return Post.objects.filter(hot_score__isnull=False)
+
+
+def retire_cold_posts(now=None):
+    """Убрать из ленты посты с весом меньше HOT_MIN_WEIGHT.
+
+    Условие - диапазон по индексу hot_score, поэтому изменяются
+    только остывшие строки.
+    """
+    cutoff = event_score(settings.HOT_MIN_WEIGHT, now or timezone.now())
+    retired = Post.objects.filter(hot_score__lt=cutoff).update(
+        hot_score=None
+    )
+    if retired:
+        bump_generation(HOT_GENERATION)
+    return retired
+
+
+def rebuild_hot_scores(now=None, batch_size=500):
+    """Пересчитать рейтинг по комментариям, вернуть число постов.
+
+    Нужен после массовой загрузки, которая не отправляет сигналы.
+    У подписок нет даты, поэтому их вес при пересчёте теряется.
+    """
+    now = now or timezone.now()
+    # Старше horizon комментарий весит меньше HOT_MIN_WEIGHT
+    horizon = settings.HOT_HALF_LIFE * math.log2(
+        settings.HOT_COMMENT_WEIGHT / settings.HOT_MIN_WEIGHT
+    )
+    scores = {}
+    comments = Comment.objects.filter(
+        created__gte=now - timedelta(seconds=horizon)
+    ).values_list('post_id', 'created')
+    for post_id, created in comments.iterator():
+        score = event_score(settings.HOT_COMMENT_WEIGHT, created)
+        if post_id in scores:
+            score = _logaddexp(scores[post_id], score)
+        scores[post_id] = score
+    with transaction.atomic():
+        Post.objects.filter(hot_score__isnull=False).update(hot_score=None)
+        Post.objects.bulk_update(
+            [Post(pk=pk, hot_score=score) for pk, score in scores.items()],
+            ['hot_score'], batch_size=batch_size
+        )
+    bump_generation(HOT_GENERATION)
+    return len(scores)
@@ -0,0 +1,56 @@
+"""Общие инструменты команд массовой загрузки данных."""
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import transaction
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключить auto_now_add, чтобы задать даты самим."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_insert(model, objects, batch_size, ignore_conflicts=False):
+    """Вставить объекты пачками, каждую в своей транзакции.
+
+    Возвращает pk вставленных строк в порядке objects. Если база не
+    возвращает pk из bulk_create (SQLite), они выбираются как новые
+    строки после последнего существующего pk в той же транзакции:
+    запись в SQLite блокирует базу до её конца, поэтому чужие строки
+    в выборку не попадают.
+    """
+    pks = []
+    for batch in batches(objects, batch_size):
+        with transaction.atomic():
+            last_pk = model.objects.order_by('-pk').values_list(
+                'pk', flat=True
+            ).first() or 0
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts
+            )
+            if ignore_conflicts:
+                continue
+            if batch[0].pk is None:
+                pks.extend(
+                    model.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', flat=True)[:len(batch)]
+                )
+            else:
+                pks.extend(obj.pk for obj in batch)
+    return pks
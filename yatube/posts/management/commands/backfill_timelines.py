@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow
+from posts.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='users', default=[],
+            help='Имя пользователя (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.all()
+        if options['users']:
+            follows = follows.filter(user__username__in=options['users'])
+        user_ids = follows.order_by('user_id').values_list(
+            'user_id', flat=True
+        ).distinct()
+        rebuilt = 0
+        for user_id in user_ids.iterator():
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
@@ -0,0 +1,192 @@
+import json
+import random
+import time
+from contextlib import nullcontext
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+
+# Без --warm-cache кэш очищается перед каждым запросом. Чтобы не
+# сбрасывать общий кэш сайта и локальные копии TwoTierCache во всех
+# процессах, такие замеры идут с отдельным кэшем в памяти процесса.
+COLD_CACHES = {
+    'default': {
+        'BACKEND': 'core.backends.cache.InstrumentedLocMemCache',
+        'LOCATION': 'benchmark-views',
+    },
+}
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(round(percent / 100 * len(ordered) + 0.5) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа и количество SQL-запросов основных страниц '
+        'через тестовый клиент Django и сравнивает с сохранённым базисом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Количество запросов на сценарий')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Использовать кэш сайта и не очищать его перед запросами'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--baseline',
+                            help='JSON с результатами для сравнения')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базиса (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включён: debug_toolbar и журнал SQL-запросов '
+                'искажают замеры'
+            )
+        self.random = random.Random(options['seed'])
+        self.warm_cache = options['warm_cache']
+        caches = (
+            nullcontext() if self.warm_cache
+            else override_settings(CACHES=COLD_CACHES)
+        )
+        results = {}
+        with caches:
+            scenarios = self.scenarios()
+            for name, (client, urls) in scenarios.items():
+                results[name] = self.run(client, urls, options['requests'])
+                self.report(name, results[name])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def sample(self, values_list, count=20):
+        """Случайные значения из первых строк без ORDER BY RANDOM()."""
+        values = sorted(set(values_list[:1000]))
+        return self.random.sample(values, min(count, len(values)))
+
+    def scenarios(self):
+        recent_posts = Post.objects.order_by('-pub_date')
+        post_ids = self.sample(recent_posts.values_list('pk', flat=True))
+        if not post_ids:
+            raise CommandError(
+                'Нет постов: сначала выполните generate_dataset'
+            )
+        slugs = self.sample(Group.objects.values_list('slug', flat=True))
+        authors = self.sample(
+            recent_posts.values_list('author__username', flat=True)
+        )
+        followers = self.sample(
+            Follow.objects.order_by('-pk').values_list('user', flat=True), 1
+        )
+        words = [
+            word for text in Post.objects.filter(
+                pk__in=post_ids
+            ).values_list('text', flat=True)
+            for word in text.split() if len(word) > 4
+        ]
+
+        guest = Client()
+        scenarios = {
+            'index': (guest, [reverse('posts:index')]),
+            'group_list': (guest, [
+                reverse('posts:group_list', kwargs={'slug': slug})
+                for slug in slugs
+            ]),
+            'profile': (guest, [
+                reverse('posts:profile', kwargs={'username': username})
+                for username in authors
+            ]),
+            'post_detail': (guest, [
+                reverse('posts:post_detail', kwargs={'post_id': pk})
+                for pk in post_ids
+            ]),
+            'search': (guest, [
+                reverse('posts:index') + '?' + urlencode({'search': word})
+                for word in words[:20]
+            ]),
+        }
+        if followers:
+            client = Client()
+            client.force_login(User.objects.get(pk=followers[0]))
+            scenarios['follow_index'] = (
+                client, [reverse('posts:follow_index')]
+            )
+        return {name: value for name, value in scenarios.items() if value[1]}
+
+    def run(self, client, urls, count):
+        latencies, queries = [], []
+        for _ in range(count):
+            if not self.warm_cache:
+                cache.clear()
+            url = self.random.choice(urls)
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{url} вернул статус {response.status_code}'
+                )
+            queries.append(len(context.captured_queries))
+        result = {
+            f'p{percent}_ms': round(percentile(latencies, percent), 2)
+            for percent in PERCENTILES
+        }
+        result['queries_max'] = max(queries)
+        result['queries_avg'] = round(sum(queries) / len(queries), 2)
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:12} ' + '  '.join(
+                f'{key}={value}' for key, value in sorted(result.items())
+            )
+        )
+
+    def compare(self, results, path, tolerance):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {result["p95_ms"]} мс, '
+                    f'базис {expected["p95_ms"]} мс'
+                )
+            if result['queries_max'] > expected['queries_max']:
+                regressions.append(
+                    f'{name}: {result["queries_max"]} запросов, '
+                    f'базис {expected["queries_max"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено'))
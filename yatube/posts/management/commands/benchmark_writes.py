@@ -0,0 +1,103 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from posts.models import Comment, Post
+
+from .replicate_sqlite import replicate
+
+User = get_user_model()
+
+# Настройки SQLite по умолчанию, с которыми сравниваются SQLITE_PRAGMAS
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def write_comments(path, pragmas, writes, post_ids, user_ids, seed):
+    """Записать комментарии из дочернего процесса, вернуть число ошибок."""
+    settings.SQLITE_PRAGMAS = pragmas
+    connections['default'].settings_dict['NAME'] = path
+    generator = random.Random(seed)
+    errors = 0
+    try:
+        for _ in range(writes):
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(
+                        post_id=generator.choice(post_ids),
+                        author_id=generator.choice(user_ids),
+                        text='Комментарий для замера записи',
+                    )
+            except OperationalError:
+                errors += 1
+    finally:
+        connections.close_all()
+    return errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность записи в SQLite несколькими '
+        'процессами с настройками по умолчанию и с SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Количество записей на процесс')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES['default']
+        if not database['ENGINE'].endswith('sqlite3'):
+            raise CommandError('Команда предназначена только для SQLite')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+        if not post_ids:
+            raise CommandError(
+                'Нет постов: сначала выполните generate_dataset'
+            )
+        modes = {
+            'по умолчанию': DEFAULT_PRAGMAS,
+            'SQLITE_PRAGMAS': settings.SQLITE_PRAGMAS,
+        }
+        for name, pragmas in modes.items():
+            with tempfile.TemporaryDirectory() as directory:
+                # Замер идёт на копии, рабочая база не меняется
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                replicate(database['NAME'], path)
+                # Режим журнала хранится в файле: меняем его до запуска
+                # процессов, чтобы они не переключали его наперегонки
+                copy = sqlite3.connect(path)
+                copy.execute(
+                    f'PRAGMA journal_mode = {pragmas["journal_mode"]}'
+                )
+                copy.close()
+                rate, errors = self.run(path, pragmas, post_ids, user_ids,
+                                        options)
+            self.stdout.write(
+                f'{name}: {rate:.0f} записей/с, '
+                f'ошибок «database is locked»: {errors}'
+            )
+
+    def run(self, path, pragmas, post_ids, user_ids, options):
+        workers, writes = options['workers'], options['writes']
+        # Дочерние процессы не должны наследовать открытые соединения
+        connections.close_all()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(write_comments, path, pragmas, writes,
+                            post_ids, user_ids, options['seed'] + worker)
+                for worker in range(workers)
+            ]
+            errors = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - start
+        return (workers * writes - errors) / elapsed, errors
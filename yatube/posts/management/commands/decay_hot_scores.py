@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.hot import rebuild_hot_scores, retire_cold_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Убирает из ленты «горячих» постов остывшие посты; запускается '
+        'по расписанию. С --rebuild пересчитывает рейтинг по комментариям'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинг всех постов после массовой загрузки'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            scored = rebuild_hot_scores()
+            self.stdout.write(f'Постов с рейтингом: {scored}')
+        retired = retire_cold_posts()
+        self.stdout.write(f'Остывших постов: {retired}')
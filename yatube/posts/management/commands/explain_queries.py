@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.hot import hot_posts
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import (
+    COMMENTS_PER_PAGE, POSTS_PER_PAGE, CommentCursorPaginator,
+    CursorPaginator, HotCursorPaginator
+)
+from posts.timeline import timeline_paginator
+
+User = get_user_model()
+
+# Признаки плохого плана в выводе EXPLAIN QUERY PLAN
+FULL_SCAN = 'полный просмотр таблицы'
+TEMP_SORT = 'сортировка без индекса'
+
+
+def plan_problems(plan):
+    """Проблемы плана SQLite: просмотр без индекса и сортировка."""
+    problems = []
+    for line in plan.splitlines():
+        if 'SCAN' in line and 'USING' not in line:
+            problems.append(f'{FULL_SCAN}: {line.strip()}')
+        if 'USE TEMP B-TREE' in line:
+            problems.append(f'{TEMP_SORT}: {line.strip()}')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов основных страниц и '
+        'сообщает, используются ли индексы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить план каждого запроса')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться ошибкой, если какой-то запрос без индекса'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда разбирает планы только для SQLite')
+        failed = []
+        for name, queryset in self.queries().items():
+            plan = queryset.explain()
+            problems = plan_problems(plan)
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.WARNING(f'{name}: без индекса'))
+                for problem in problems:
+                    self.stdout.write(f'  {problem}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+        if failed and options['strict']:
+            raise CommandError(
+                'Запросы без индекса: ' + ', '.join(failed)
+            )
+
+    def queries(self):
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        follow = Follow.objects.first()
+        if post is None or follow is None:
+            raise CommandError(
+                'Нужны посты и подписки: сначала выполните generate_dataset'
+            )
+        group_id = (
+            Group.objects.values_list('pk', flat=True).first() or 0
+        )
+        posts = Post.objects.select_related('author', 'group')
+        cursor = CursorPaginator.encode_cursor(post)
+
+        def feed(queryset, page_cursor=None, paginator_class=CursorPaginator):
+            paginator = paginator_class(queryset, POSTS_PER_PAGE)
+            return paginator.page_queryset(page_cursor)
+
+        hot_cursor = HotCursorPaginator.encode_cursor(
+            Post(pk=post.pk, hot_score=0.0)
+        )
+        return {
+            'index': feed(posts),
+            'index_next_page': feed(posts, cursor),
+            'index_hot': feed(
+                hot_posts().select_related('author', 'group'), hot_cursor,
+                HotCursorPaginator
+            ),
+            'group_list': feed(posts.filter(group_id=group_id)),
+            'group_list_next_page': feed(
+                posts.filter(group_id=group_id), cursor
+            ),
+            'profile': feed(posts.filter(author_id=post.author_id)),
+            'follow_index': timeline_paginator(
+                follow.user, posts
+            ).page_queryset(None),
+            'follow_index_next_page': timeline_paginator(
+                follow.user, posts
+            ).page_queryset(cursor),
+            'post_detail_comments': CommentCursorPaginator(
+                Comment.objects.filter(post_id=post.pk).select_related(
+                    'author'
+                ),
+                COMMENTS_PER_PAGE
+            ).page_queryset(None),
+            'profile_following': Follow.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ),
+            'author_followers': Follow.objects.filter(
+                author_id=follow.author_id
+            ).values('user_id'),
+        }
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import CHUNK_SIZE, FIELDS, FORMATS, export_lines
+from posts.forms import ExportFilterForm
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты или комментарии в NDJSON или CSV потоково, '
+        'не загружая таблицу в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(FIELDS))
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='ndjson')
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--since', help='Дата и время начала периода')
+        parser.add_argument('--until',
+                            help='Дата и время конца периода (не включая)')
+        parser.add_argument('--output',
+                            help='Файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        form = ExportFilterForm({
+            field: options[field]
+            for field in ('author', 'group', 'since', 'until')
+            if options[field]
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        lines = export_lines(
+            options['kind'], options['format'],
+            chunk_size=options['chunk_size'], **form.cleaned_data
+        )
+        if options['output']:
+            with open(options['output'], 'w', newline='',
+                      encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,164 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faker import Faker
+
+from posts.models import Comment, Follow, Group, Post
+
+from ._bulk import bulk_insert, explicit_dates
+
+User = get_user_model()
+
+# Сколько разных предложений сгенерировать заранее: Faker слишком
+# медленный, чтобы вызывать его для каждого из миллионов постов.
+SENTENCE_POOL_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочного '
+        'тестирования: пользователи, группы, посты, комментарии и граф '
+        'подписок со степенным распределением популярности авторов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='Среднее количество подписок пользователя'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степенного распределения популярности авторов'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--locale', default='ru_RU')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        fake = Faker(options['locale'])
+        if options['seed'] is not None:
+            fake.seed_instance(options['seed'])
+        self.sentences = [
+            fake.sentence(nb_words=12) for _ in range(SENTENCE_POOL_SIZE)
+        ]
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'], fake)
+        # Популярность автора убывает с рангом: 1 / rank ** zipf
+        ranks = range(1, len(user_ids) + 1)
+        cum_weights = list(accumulate(
+            1 / rank ** options['zipf'] for rank in ranks
+        ))
+        post_ids = self.create_posts(
+            options['posts'], user_ids, group_ids, cum_weights
+        )
+        self.create_comments(options['comments'], user_ids, post_ids)
+        self.create_follows(
+            options['follows_per_user'], user_ids, cum_weights
+        )
+
+        # bulk_create не отправляет сигналы: пересобираем производные
+        # данные одним проходом.
+        call_command('rebuild_derived_data', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы'))
+
+    def text(self, sentences=3):
+        return ' '.join(self.random.choices(self.sentences, k=sentences))
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.uniform(0, self.period)
+        )
+
+    def insert(self, model, objects):
+        return bulk_insert(model, objects, self.batch_size)
+
+    def create_users(self, count):
+        password = make_password(None)
+        prefix = f'bench_{self.random.getrandbits(32):08x}'
+        user_ids = self.insert(User, (
+            User(username=f'{prefix}_{i}', password=password)
+            for i in range(count)
+        ))
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_groups(self, count, fake):
+        prefix = f'bench-{self.random.getrandbits(32):08x}'
+        group_ids = self.insert(Group, (
+            Group(
+                title=fake.catch_phrase()[:200],
+                slug=f'{prefix}-{i}',
+                description=self.text(2),
+            )
+            for i in range(count)
+        ))
+        self.stdout.write(f'Групп: {len(group_ids)}')
+        return group_ids
+
+    def create_posts(self, count, user_ids, group_ids, cum_weights):
+        authors = self.random.choices(user_ids, cum_weights=cum_weights,
+                                      k=count)
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            post_ids = self.insert(Post, (
+                Post(
+                    author_id=author_id,
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < 0.7
+                        else None
+                    ),
+                    text=self.text(),
+                    pub_date=self.random_date(),
+                )
+                for author_id in authors
+            ))
+        self.stdout.write(f'Постов: {len(post_ids)}')
+        return post_ids
+
+    def create_comments(self, count, user_ids, post_ids):
+        if not post_ids:
+            return
+        with explicit_dates(Comment._meta.get_field('created')):
+            comment_ids = self.insert(Comment, (
+                Comment(
+                    post_id=self.random.choice(post_ids),
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(1),
+                    created=self.random_date(),
+                )
+                for _ in range(count)
+            ))
+        self.stdout.write(f'Комментариев: {len(comment_ids)}')
+
+    def create_follows(self, per_user, user_ids, cum_weights):
+        def follows():
+            for user_id in user_ids:
+                # Количество подписок тоже неравномерно
+                count = min(
+                    int(self.random.expovariate(1 / per_user)),
+                    len(user_ids) - 1
+                )
+                authors = set(self.random.choices(
+                    user_ids, cum_weights=cum_weights, k=count
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+        follow_ids = self.insert(Follow, follows())
+        self.stdout.write(f'Подписок: {len(follow_ids)}')
@@ -0,0 +1,198 @@
+import csv
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Comment, Follow, Group, Post
+
+from ._bulk import batches, bulk_insert, explicit_dates
+
+User = get_user_model()
+
+
+def read_rows(path):
+    """Построчно читать NDJSON или CSV, не загружая файл в память."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.csv', '.ndjson', '.jsonl'):
+        raise CommandError(f'{path}: ожидается .csv, .ndjson или .jsonl')
+    with open(path, newline='', encoding='utf-8') as source:
+        if extension == '.csv':
+            yield from csv.DictReader(source)
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'{path}:{number}: {error}')
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    date = parse_datetime(value)
+    if date is None:
+        raise CommandError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует группы, посты, комментарии и подписки из файлов '
+        'NDJSON или CSV пачками через bulk_create. Авторы указываются '
+        'по username, группы по slug, комментарии ссылаются на поле id '
+        'поста из файла постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', help='Поля: slug, title, description')
+        parser.add_argument(
+            '--posts', help='Поля: id, author, text, group, pub_date, image'
+        )
+        parser.add_argument(
+            '--comments', help='Поля: post, author, text, created'
+        )
+        parser.add_argument('--follows', help='Поля: user, author')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать отсутствующих авторов без пароля'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.create_users = options['create_users']
+        self.skipped = 0
+        self.now = timezone.now()
+        # Справочники держим в памяти, чтобы не делать запрос на строку
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.post_ids = {}
+
+        if options['groups']:
+            self.import_groups(options['groups'])
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        if options['posts']:
+            self.import_posts(options['posts'])
+        if options['comments']:
+            self.import_comments(options['comments'])
+        if options['follows']:
+            self.import_follows(options['follows'])
+
+        if self.skipped:
+            self.stderr.write(f'Пропущено строк: {self.skipped}')
+        # bulk_create не отправляет сигналы, поэтому счётчики, ленты и
+        # поисковый индекс пересобираются один раз в конце.
+        call_command('rebuild_derived_data', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
+
+    def resolve_users(self, usernames):
+        """Создать недостающих пользователей пачки, если это разрешено."""
+        missing = {name for name in usernames if name} - self.users.keys()
+        if not missing or not self.create_users:
+            return
+        password = make_password(None)
+        names = sorted(missing)
+        pks = bulk_insert(User, (
+            User(username=name, password=password) for name in names
+        ), self.batch_size)
+        self.users.update(zip(names, pks))
+
+    def resolved(self, rows, user_fields):
+        """Пачки строк, у которых найдены все пользователи."""
+        for batch in batches(rows, self.batch_size):
+            self.resolve_users(
+                row.get(field) for row in batch for field in user_fields
+            )
+            for row in batch:
+                if all(row.get(field) in self.users for field in user_fields):
+                    yield row
+                else:
+                    self.skipped += 1
+
+    def import_groups(self, path):
+        existing = set(Group.objects.values_list('slug', flat=True))
+
+        def groups():
+            for row in read_rows(path):
+                if not row.get('slug') or row['slug'] in existing:
+                    self.skipped += 1
+                    continue
+                existing.add(row['slug'])
+                yield Group(
+                    slug=row['slug'],
+                    title=row.get('title') or row['slug'],
+                    description=row.get('description', ''),
+                )
+        group_ids = bulk_insert(Group, groups(), self.batch_size)
+        self.stdout.write(f'Групп: {len(group_ids)}')
+
+    def import_posts(self, path):
+        source_ids = []
+
+        def posts():
+            for row in self.resolved(read_rows(path), ('author',)):
+                group = row.get('group')
+                if not row.get('text') or group and group not in self.groups:
+                    self.skipped += 1
+                    continue
+                source_ids.append(row.get('id'))
+                yield Post(
+                    author_id=self.users[row['author']],
+                    group_id=self.groups.get(group),
+                    text=row['text'],
+                    pub_date=parse_date(row.get('pub_date'), self.now),
+                    image=row.get('image') or '',
+                )
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            post_ids = bulk_insert(Post, posts(), self.batch_size)
+        self.post_ids = {
+            str(source_id): pk
+            for source_id, pk in zip(source_ids, post_ids)
+            if source_id not in (None, '')
+        }
+        self.stdout.write(f'Постов: {len(post_ids)}')
+
+    def import_comments(self, path):
+        def comments():
+            for row in self.resolved(read_rows(path), ('author',)):
+                post_id = self.post_ids.get(str(row.get('post')))
+                if post_id is None or not row.get('text'):
+                    self.skipped += 1
+                    continue
+                yield Comment(
+                    post_id=post_id,
+                    author_id=self.users[row['author']],
+                    text=row['text'],
+                    created=parse_date(row.get('created'), self.now),
+                )
+        with explicit_dates(Comment._meta.get_field('created')):
+            comment_ids = bulk_insert(Comment, comments(), self.batch_size)
+        self.stdout.write(f'Комментариев: {len(comment_ids)}')
+
+    def import_follows(self, path):
+        count = 0
+
+        def follows():
+            nonlocal count
+            for row in self.resolved(read_rows(path), ('user', 'author')):
+                if row['user'] == row['author']:
+                    self.skipped += 1
+                    continue
+                count += 1
+                yield Follow(
+                    user_id=self.users[row['user']],
+                    author_id=self.users[row['author']],
+                )
+        # Уже существующие подписки молча пропускаются
+        bulk_insert(Follow, follows(), self.batch_size,
+                    ignore_conflicts=True)
+        self.stdout.write(f'Подписок: {count}')
@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.pagecache import invalidate_site
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает производные данные после массовой загрузки: '
+        'счётчики авторов, ленты подписок, поисковый индекс, рейтинг '
+        '«горячих» постов и кэш страниц'
+    )
+
+    def handle(self, *args, **options):
+        for command in ('reconcile_author_stats', 'backfill_timelines',
+                        'rebuild_search_index'):
+            call_command(command, stdout=self.stdout)
+        call_command('decay_hot_scores', rebuild=True, stdout=self.stdout)
+        # Страницы и их валидаторы не получали сигналов о новых данных
+        invalidate_site()
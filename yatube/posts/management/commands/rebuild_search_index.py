@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.cache import invalidate_feeds
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество постов, индексируемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = get_backend().rebuild(options['batch_size'])
+        # Результаты поиска в кэше лент могли устареть
+        invalidate_feeds()
+        self.stdout.write(f'Проиндексировано постов: {indexed}')
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.stats import reconcile_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество пользователей, пересчитываемых за один проход'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                fixed += reconcile_stats(user_ids)
+            last_pk = user_ids[-1]
+        self.stdout.write(f'Исправлено счётчиков: {fixed}')
@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def replicate(source_path, target_path):
+    """Скопировать базу SQLite целиком через backup API.
+
+    Копия согласованна: backup читает источник в одной транзакции, а
+    читатели реплики видят либо старое, либо новое состояние.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Имитация репликации для локальной разработки: копирует основную '
+        'базу SQLite в файлы реплик из DATABASE_REPLICAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять копирование каждые N секунд'
+        )
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        targets = [
+            databases[alias]['NAME'] for alias in settings.DATABASE_REPLICAS
+            if databases[alias]['ENGINE'].endswith('sqlite3')
+        ]
+        if not targets:
+            raise CommandError('Не настроены реплики SQLite')
+        source = databases['default']['NAME']
+        while True:
+            for target in targets:
+                replicate(source, target)
+            self.stdout.write(f'Реплик обновлено: {len(targets)}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
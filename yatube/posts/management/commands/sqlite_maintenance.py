@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание SQLite для запуска по расписанию: переносит журнал '
+        'WAL в основной файл и обновляет статистику планировщика'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checkpoint', choices=CHECKPOINT_MODES, default='TRUNCATE',
+            help='Режим wal_checkpoint; TRUNCATE ещё и обнуляет файл -wal'
+        )
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Дополнительно выполнить VACUUM')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA wal_checkpoint({options["checkpoint"]})')
+            busy, log_frames, checkpointed = cursor.fetchone()
+            if busy:
+                self.stderr.write(
+                    'Контрольная точка не завершена: базу держат читатели'
+                )
+            self.stdout.write(
+                f'WAL: страниц в журнале {log_frames}, '
+                f'перенесено {checkpointed}'
+            )
+            cursor.execute('PRAGMA optimize')
+            if options['vacuum']:
+                cursor.execute('VACUUM')
+        self.stdout.write(self.style.SUCCESS('Обслуживание завершено'))
@@ -0,0 +1,51 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.thumbnails import generate_thumbnails
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def warm_image(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+        return False
+    finally:
+        connections.close_all()
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для всех изображений постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Количество процессов (по умолчанию - число ядер)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=16,
+            help='Количество изображений, передаваемых процессу за раз'
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).distinct()
+        )
+        # Дочерние процессы не должны наследовать открытые соединения
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(
+                pool.map(warm_image, names, chunksize=options['chunk_size'])
+            )
+        failed = results.count(False)
+        self.stdout.write(
+            f'Обработано изображений: {len(results)}, ошибок: {failed}'
+        )
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0032_timelineentry_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
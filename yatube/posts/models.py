@@ -49,11 +49,31 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    # Логарифм затухающей суммы комментариев и подписок (posts.hot);
+    # у постов без недавней активности - NULL
+    hot_score = models.FloatField(
+        'Рейтинг',
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Порядок столбцов совпадает с порядком лент (-pub_date, -id):
+        # страница читается из индекса без сортировки
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+            models.Index(fields=['-hot_score', '-id'],
+                         name='post_hot_idx'),
+        ]
 
     def __str__(self):
         # выводим текст поста
@@ -82,6 +102,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -100,9 +124,83 @@ class Follow(models.Model):
     )
 
     class Meta:
+        # Ограничение уникальности индексирует (user, author),
+        # обратное направление - отдельный индекс
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия post.pub_date: страница ленты читается из индекса
+    # (user, -pub_date, -post) без соединения с постами и сортировки
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_feed_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики постов и подписок пользователя.
+
+    Обновляются сигналами при создании и удалении постов и подписок,
+    расхождения исправляет команда reconcile_author_stats. celebrity
+    отмечает авторов, посты которых не раскладываются по лентам
+    подписчиков (posts.timeline).
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок',
+        default=0
+    )
+    celebrity = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'Статистика {self.user}'
@@ -0,0 +1,267 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.cache import get_or_compute
+
+from .cache import feed_generation
+from .totals import get_total, set_total
+
+# Количество постов на странице ленты
+POSTS_PER_PAGE = 10
+# Количество комментариев, загружаемых к посту за один раз
+COMMENTS_PER_PAGE = 20
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (key_field, id_field), по умолчанию (pub_date, id).
+
+    Страница выбирается условием WHERE по ключу последней показанной
+    записи, поэтому любая страница стоит столько же, сколько первая:
+    нет ни COUNT(*), ни OFFSET. Вместо номеров страниц используются
+    непрозрачные курсоры next_cursor/previous_cursor.
+    """
+    cursor_based = True
+    key_field = 'pub_date'
+    # Поле с id записи страницы; курсор хранит pk этой записи
+    id_field = 'id'
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by(f'-{self.key_field}', f'-{self.id_field}'),
+            per_page, **kwargs
+        )
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        # Номера страниц относительны текущей: 1 - первая, 2 - есть
+        # предыдущие; ещё одна страница, если есть следующие.
+        return self._num_pages
+
+    @classmethod
+    def encode_cursor(cls, obj, reverse=False):
+        data = {'r': reverse}
+        if obj is not None:
+            data.update(d=cls.dump_key(getattr(obj, cls.key_field)),
+                        i=obj.pk)
+        raw = json.dumps(data, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def dump_key(value):
+        return value.isoformat()
+
+    @staticmethod
+    def load_key(value):
+        return parse_datetime(value)
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        """Вернуть (ключ, id, reverse) или None для первой страницы."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw.decode())
+            key = pk = None
+            # Без ключа допустим только курсор последней страницы;
+            # ключ и id записи задаются только вместе
+            if 'd' in data or 'i' in data:
+                key, pk = cls.load_key(data['d']), int(data['i'])
+                if key is None:
+                    return None
+            return key, pk, bool(data['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            return None
+
+    def page_queryset(self, cursor):
+        """Запрос строк страницы; на одну больше, чтобы узнать о следующей."""
+        position = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if position is None:
+            key, pk, reverse = None, None, False
+        else:
+            key, pk, reverse = position
+        field, id_field = self.key_field, self.id_field
+        # Лишнее условие key_field <= ключа (>= назад) превращает OR в
+        # один просмотр диапазона индекса без сортировки
+        if reverse:
+            queryset = queryset.order_by(field, id_field)
+            if key is not None:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__gt': key})
+                    | Q(**{field: key, f'{id_field}__gt': pk}),
+                    **{f'{field}__gte': key}
+                )
+        elif key is not None:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': key})
+                | Q(**{field: key, f'{id_field}__lt': pk}),
+                **{f'{field}__lte': key}
+            )
+        return queryset[:self.per_page + 1]
+
+    def get_rows(self, cursor):
+        """Записи страницы в порядке запроса page_queryset."""
+        return list(self.page_queryset(cursor))
+
+    def get_page(self, cursor):
+        """Вернуть страницу по курсору; неверный курсор - первая страница."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            key, reverse = None, False
+        else:
+            key, _, reverse = position
+        rows = self.get_rows(cursor)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = has_more, key is not None
+        else:
+            has_previous, has_next = key is not None, has_more
+
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            self.encode_cursor(rows[-1]) if has_next and rows else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(rows[0], reverse=True)
+            if has_previous and rows else None
+        )
+        page.last_cursor = self.encode_cursor(None, reverse=True)
+        return page
+
+
+class CommentCursorPaginator(CursorPaginator):
+    """Пагинация комментариев по ключу (created, id)."""
+    key_field = 'created'
+
+
+class HotCursorPaginator(CursorPaginator):
+    """Пагинация «горячих» постов по ключу (hot_score, id)."""
+    key_field = 'hot_score'
+
+    @staticmethod
+    def dump_key(value):
+        return value
+
+    @staticmethod
+    def load_key(value):
+        return float(value)
+
+
+class TimelineCursorPaginator(CursorPaginator):
+    """Пагинация ленты подписок по ключу (pub_date, post).
+
+    object_list - записи TimelineEntry пользователя: ключи страницы
+    читаются из индекса (user, -pub_date, -post) без соединения с
+    постами. С ними сливаются ключи из запросов merged - постов
+    авторов, которые не раскладываются по лентам; каждый запрос
+    выбирает не больше страницы. Сами посты загружаются из posts.
+    """
+    id_field = 'post_id'
+
+    def __init__(self, object_list, per_page, posts, merged=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.posts = posts
+        self.merged = [
+            CursorPaginator(queryset, per_page) for queryset in merged
+        ]
+
+    def get_rows(self, cursor):
+        position = self.decode_cursor(cursor)
+        reverse = position is not None and position[2]
+        keys = set(
+            self.page_queryset(cursor).values_list('pub_date', 'post_id')
+        )
+        for paginator in self.merged:
+            keys.update(
+                paginator.page_queryset(cursor).values_list('pub_date', 'id')
+            )
+        keys = sorted(keys, reverse=not reverse)[:self.per_page + 1]
+        posts = self.posts.in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который кэширует COUNT(*) до изменения постов.
+
+    Ключ строится из SQL запроса и поколения кэша лент, поэтому
+    подходит только для выборок, зависящих лишь от постов и групп.
+    """
+
+    @cached_property
+    def count(self):
+        query = str(self.object_list.query)
+        key = 'paginator:count:{}:{}'.format(
+            feed_generation(), hashlib.md5(query.encode()).hexdigest()
+        )
+        return get_or_compute(
+            key, lambda: Paginator.count.func(self),
+            settings.FEED_CACHE_TIMEOUT
+        )
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """Paginator с приблизительным количеством для больших лент.
+
+    Количество постов ленты scope берётся из posts.totals. Пока его
+    нет или оно меньше порога, считается точный COUNT(*), кэшированный
+    как в CachedCountPaginator; иначе используется само это количество,
+    а approximate = True сообщает шаблону, что оно примерное.
+    """
+
+    def __init__(self, object_list, per_page, scope, threshold=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        if threshold is None:
+            threshold = settings.PAGINATOR_ESTIMATE_THRESHOLD
+        self.threshold = threshold
+        self.approximate = False
+
+    @cached_property
+    def count(self):
+        total = get_total(self.scope)
+        if total is not None and total >= self.threshold:
+            self.approximate = True
+            return total
+        count = CachedCountPaginator.count.func(self)
+        if total is None:
+            set_total(self.scope, count)
+        return count
+
+
+def paginate(request, posts, count_scope=None,
+             cursor_class=CursorPaginator):
+    """Страница ленты для запроса.
+
+    По умолчанию используется курсорная пагинация; явный ?page=N
+    обслуживается обычным Paginator для старых ссылок. count_scope -
+    лента из posts.totals, для которой количество постов может быть
+    оценено EstimatedCountPaginator. cursor_class задаёт ключ порядка
+    ленты.
+    """
+    page_number = request.GET.get('page')
+    if page_number:
+        posts = posts.order_by(f'-{cursor_class.key_field}', '-id')
+        if count_scope is None:
+            paginator = Paginator(posts, POSTS_PER_PAGE)
+        else:
+            paginator = EstimatedCountPaginator(
+                posts, POSTS_PER_PAGE, count_scope
+            )
+        return paginator.get_page(page_number)
+    paginator = cursor_class(posts, POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
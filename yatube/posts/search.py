@@ -0,0 +1,137 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой POSTS_SEARCH_BACKEND. По умолчанию для
+SQLite используется виртуальная таблица FTS5, которая обновляется
+сигналами при сохранении и удалении постов. Для других баз данных
+подключается свой бэкенд с тем же интерфейсом.
+"""
+import re
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+TERM_RE = re.compile(r'\w+')
+
+
+class BaseSearchBackend:
+    """Интерфейс поискового бэкенда."""
+
+    def index_post(self, post):
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        raise NotImplementedError
+
+    def search(self, query, limit):
+        """Вернуть id постов, отсортированные по релевантности."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        """Переиндексировать все посты, вернуть их количество."""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Поиск подстрокой средствами ORM, без отдельного индекса."""
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def search(self, query, limit):
+        return list(
+            Post.objects.filter(text__icontains=query)
+            .values_list('pk', flat=True)[:limit]
+        )
+
+    def rebuild(self, batch_size=1000):
+        return Post.objects.count()
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """Поиск по виртуальной таблице FTS5 с ранжированием bm25."""
+    table = 'posts_post_fts'
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово ищется как префикс; кавычки экранируют синтаксис
+        # FTS5, поэтому пользовательский ввод не ломает запрос.
+        terms = TERM_RE.findall(query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table}(rowid, text) '
+                f'VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+
+    def search(self, query, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s',
+                [expression, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=1000):
+        indexed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                f'USING fts5(text)'
+            )
+            cursor.execute(f'DELETE FROM {self.table}')
+            batch = []
+            posts = Post.objects.values_list('pk', 'text').order_by('pk')
+            for row in posts.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._insert(cursor, batch)
+                    indexed += len(batch)
+                    batch = []
+            self._insert(cursor, batch)
+            indexed += len(batch)
+        return indexed
+
+    def _insert(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {self.table}(rowid, text) VALUES (%s, %s)',
+                rows
+            )
+
+
+def get_backend():
+    return import_string(settings.POSTS_SEARCH_BACKEND)()
+
+
+def search_page(query, page_number, per_page):
+    """Страница результатов поиска в порядке релевантности."""
+    post_ids = get_backend().search(query, settings.POSTS_SEARCH_LIMIT)
+    page = Paginator(post_ids, per_page).get_page(page_number)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page.object_list
+    )
+    page.object_list = [
+        posts[pk] for pk in page.object_list if pk in posts
+    ]
+    return page
@@ -0,0 +1,138 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import hot, timeline, totals
+from .cache import invalidate_feeds
+from .conditional import GROUP, POST, USER, touch, touch_groups
+from .search import get_backend
+from .stats import change_stats
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feed_cache(sender, **kwargs):
+    invalidate_feeds()
+
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    change_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, 'followers_count', 1)
+        change_stats(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    change_stats(instance.author_id, 'followers_count', -1)
+    change_stats(instance.user_id, 'following_count', -1)
+
+
+# После счётчиков подписок: популярность автора берётся из AuthorStats
+@receiver(post_save, sender=Follow)
+def add_author_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+    timeline.author_unfollowed(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    # После редактирования пост может пропасть со страницы старой группы
+    instance._previous_group_id = instance.pk and Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def touch_post_versions(sender, instance, **kwargs):
+    touch(POST, instance.pk)
+    touch(USER, instance.author_id)
+    touch(GROUP, instance.group_id)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        touch(GROUP, previous_group_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_commented_post_version(sender, instance, **kwargs):
+    touch(POST, instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def touch_group_versions(sender, instance, **kwargs):
+    touch(GROUP, instance.pk)
+    touch_groups()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_follow_versions(sender, instance, **kwargs):
+    touch(USER, instance.user_id)
+    touch(USER, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def update_post_totals(sender, instance, created, **kwargs):
+    if created:
+        totals.change_post_totals(instance, 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        totals.move_post_total(previous_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_totals(sender, instance, **kwargs):
+    totals.change_post_totals(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+def heat_commented_post(sender, instance, created, **kwargs):
+    if created:
+        hot.post_commented(instance)
+
+
+@receiver(post_save, sender=Follow)
+def heat_followed_author_posts(sender, instance, created, **kwargs):
+    if created:
+        hot.author_followed(instance.author_id)
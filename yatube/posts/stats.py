@@ -0,0 +1,71 @@
+"""Денормализованные счётчики постов и подписок пользователей."""
+from django.db.models import Count, F
+
+from .conditional import USER, touch
+from .models import AuthorStats, Follow, Post
+
+
+def get_stats(user):
+    """Счётчики пользователя; для нового пользователя - нулевые."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def change_stats(user_id, field, delta):
+    """Атомарно изменить счётчик field пользователя на delta.
+
+    Строка создаётся при первом увеличении счётчика. Уменьшение не
+    создаёт строку (например, при каскадном удалении пользователя)
+    и не опускает счётчик ниже нуля.
+    """
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    update = {field: F(field) + delta}
+    if delta < 0:
+        stats.filter(**{f'{field}__gte': -delta}).update(**update)
+    elif not stats.update(**update):
+        _, created = AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults={field: delta}
+        )
+        if not created:
+            stats.update(**update)
+
+
+def _counts(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(count=Count('id')).order_by()
+    )
+
+
+def reconcile_stats(user_ids):
+    """Пересчитать счётчики пользователей, вернуть число исправленных."""
+    posts = _counts(Post.objects.filter(author_id__in=user_ids), 'author')
+    followers = _counts(
+        Follow.objects.filter(author_id__in=user_ids), 'author'
+    )
+    following = _counts(Follow.objects.filter(user_id__in=user_ids), 'user')
+    existing = AuthorStats.objects.in_bulk(user_ids)
+    to_create, to_update = [], []
+    for user_id in user_ids:
+        actual = {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        stats = existing.get(user_id)
+        if stats is None:
+            if any(actual.values()):
+                to_create.append(AuthorStats(user_id=user_id, **actual))
+            continue
+        if any(getattr(stats, key) != value for key, value in actual.items()):
+            for key, value in actual.items():
+                setattr(stats, key, value)
+            to_update.append(stats)
+    AuthorStats.objects.bulk_create(to_create, ignore_conflicts=True)
+    AuthorStats.objects.bulk_update(
+        to_update, ['posts_count', 'followers_count', 'following_count']
+    )
+    for stats in to_create + to_update:
+        touch(USER, stats.user_id)
+    return len(to_create) + len(to_update)
@@ -0,0 +1,242 @@
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..management.commands.explain_queries import plan_problems
+from ..management.commands.replicate_sqlite import replicate
+from ..models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class DatasetCommandsTest(TestCase):
+
+    def test_generate_dataset(self):
+        call_command(
+            'generate_dataset', users=20, groups=3, posts=60, comments=30,
+            follows_per_user=3, batch_size=25, seed=1, stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        # Даты постов распределены по периоду, а не равны времени вставки
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertGreater(len(set(dates)), 1)
+        # Производные данные пересобраны после bulk_create
+        posts_count = sum(
+            AuthorStats.objects.values_list('posts_count', flat=True)
+        )
+        self.assertEqual(posts_count, 60)
+
+    def test_explain_queries_reports_index_usage(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_queries', stdout=StringIO())
+        call_command(
+            'generate_dataset', users=10, groups=2, posts=20, comments=10,
+            follows_per_user=2, seed=3, stdout=StringIO()
+        )
+        stdout = StringIO()
+        call_command('explain_queries', stdout=stdout)
+        report = stdout.getvalue()
+        for name in ('index', 'group_list', 'profile',
+                     'post_detail_comments', 'author_followers'):
+            self.assertIn(f'{name}: индекс', report)
+
+    def test_plan_problems(self):
+        self.assertEqual(plan_problems(
+            '2 0 0 SCAN posts_post USING INDEX post_feed_idx'
+        ), [])
+        self.assertEqual(len(plan_problems(
+            '2 0 0 SCAN TABLE posts_post\n9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        )), 2)
+
+    def test_benchmark_views_compares_with_baseline(self):
+        call_command(
+            'generate_dataset', users=10, groups=2, posts=20, comments=10,
+            follows_per_user=2, seed=2, stdout=StringIO()
+        )
+        cache.set('benchmark:untouched', True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command(
+                'benchmark_views', requests=3, seed=1, output=path,
+                stdout=StringIO(), stderr=StringIO()
+            )
+            # Замеры без кэша не очищают кэш сайта
+            self.assertTrue(cache.get('benchmark:untouched'))
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+            self.assertIn('p95_ms', baseline['index'])
+            self.assertIn('queries_max', baseline['post_detail'])
+            for result in baseline.values():
+                result['queries_max'] = 0
+            with open(path, 'w') as baseline_file:
+                json.dump(baseline, baseline_file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark_views', requests=3, seed=1, baseline=path,
+                    tolerance=1000, stdout=StringIO(), stderr=StringIO()
+                )
+
+
+class ImportContentTest(TestCase):
+
+    def write(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def test_import_content(self):
+        with tempfile.TemporaryDirectory() as directory:
+            groups = self.write(
+                directory, 'groups.csv',
+                'slug,title,description\nbooks,Книги,О книгах\n'
+                ',Без адреса,\n'
+            )
+            posts = self.write(directory, 'posts.ndjson', '\n'.join(
+                json.dumps(row) for row in [
+                    {'id': 'a', 'author': 'leo', 'text': 'Война и мир',
+                     'group': 'books', 'pub_date': '2020-01-01T10:00:00'},
+                    {'id': 'b', 'author': 'fyodor', 'text': 'Идиот'},
+                    {'id': 'c', 'author': 'leo', 'text': 'Нет группы',
+                     'group': 'missing'},
+                    {'id': 'd', 'author': 'leo'},
+                ]
+            ))
+            comments = self.write(
+                directory, 'comments.csv',
+                'post,author,text\na,fyodor,Прекрасно\nz,leo,Потерян\n'
+                'a,leo\n'
+            )
+            follows = self.write(
+                directory, 'follows.csv',
+                'user,author\nfyodor,leo\nleo,leo\n'
+            )
+            stderr = StringIO()
+            call_command(
+                'import_content', groups=groups, posts=posts,
+                comments=comments, follows=follows, batch_size=1,
+                create_users=True, stdout=StringIO(), stderr=stderr
+            )
+        self.assertIn('Пропущено строк: 6', stderr.getvalue())
+        post = Post.objects.get(text='Война и мир')
+        self.assertEqual(post.group.slug, 'books')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments.get().author.username, 'fyodor')
+        self.assertTrue(Follow.objects.filter(
+            user__username='fyodor', author__username='leo'
+        ).exists())
+        # Производные данные пересобраны после импорта
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        follower = Follow.objects.get().user
+        self.assertTrue(follower.timeline.filter(post=post).exists())
+
+    def test_unknown_authors_are_skipped_without_create_users(self):
+        with tempfile.TemporaryDirectory() as directory:
+            posts = self.write(
+                directory, 'posts.csv', 'author,text\nghost,Текст\n'
+            )
+            call_command('import_content', posts=posts, stdout=StringIO(),
+                         stderr=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_unsupported_format(self):
+        with self.assertRaises(CommandError):
+            call_command('import_content', posts='posts.xml',
+                         stdout=StringIO())
+
+    def test_export_then_import_round_trip(self):
+        author = User.objects.create_user(username='leo')
+        Post.objects.create(author=author, text='Война и мир')
+        Post.objects.create(author=author, text='Анна Каренина')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.csv')
+            call_command('export_content', 'posts', format='csv',
+                         output=path, chunk_size=1)
+            Post.objects.all().delete()
+            call_command('import_content', posts=path, stdout=StringIO())
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Война и мир', 'Анна Каренина'}
+        )
+
+    def test_export_to_stdout_with_filters(self):
+        author = User.objects.create_user(username='leo')
+        Post.objects.create(author=author, text='Война и мир')
+        stdout = StringIO()
+        call_command('export_content', 'posts', author='leo', stdout=stdout)
+        self.assertEqual(json.loads(stdout.getvalue())['text'], 'Война и мир')
+        stdout = StringIO()
+        call_command('export_content', 'posts', author='nobody',
+                     stdout=stdout)
+        self.assertEqual(stdout.getvalue(), '')
+        with self.assertRaises(CommandError):
+            call_command('export_content', 'posts', since='вчера')
+
+
+class ReplicateSQLiteTest(TestCase):
+
+    def test_replica_receives_primary_state(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            connection = sqlite3.connect(primary)
+            connection.execute('CREATE TABLE post (text TEXT)')
+            connection.execute("INSERT INTO post VALUES ('Первый')")
+            connection.commit()
+            replicate(primary, replica)
+            connection.execute("INSERT INTO post VALUES ('Второй')")
+            connection.commit()
+            connection.close()
+            reader = sqlite3.connect(replica)
+            self.assertEqual(
+                reader.execute('SELECT COUNT(*) FROM post').fetchone()[0], 1
+            )
+            replicate(primary, replica)
+            self.assertEqual(
+                reader.execute('SELECT COUNT(*) FROM post').fetchone()[0], 2
+            )
+            reader.close()
+
+    def test_command_requires_replicas(self):
+        with self.assertRaises(CommandError):
+            call_command('replicate_sqlite', stdout=StringIO())
+
+
+class DecayHotScoresTest(TestCase):
+
+    def test_cold_posts_leave_hot_feed(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=post, author=author, text='Первый')
+        out = StringIO()
+        call_command('decay_hot_scores', stdout=out)
+        self.assertIn('Остывших постов: 0', out.getvalue())
+        Comment.objects.filter(post=post).update(
+            created=timezone.now() - timedelta(days=30))
+        call_command('decay_hot_scores', rebuild=True, stdout=out)
+        post.refresh_from_db()
+        self.assertIsNone(post.hot_score)
+
+    def test_rebuild_matches_incremental_scores(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        for text in ('Первый', 'Второй', 'Третий'):
+            Comment.objects.create(post=post, author=author, text=text)
+        post.refresh_from_db()
+        incremental = post.hot_score
+        call_command('decay_hot_scores', rebuild=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertAlmostEqual(post.hot_score, incremental, places=6)
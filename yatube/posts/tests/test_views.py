@@ -1,14 +1,34 @@
+import base64
+import json
 import shutil
 import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
-from ..models import Group, Post, Follow
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry)
+from .utils import QueryBudgetMixin
+from ..comments import comments_count
+from ..hot import current_weight
+from ..paginators import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from ..timeline import materialize_author, rebuild_timeline
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from core.pagecache import invalidate_site
+from core.thumbnails import (
+    generate_thumbnails, is_pending, schedule_thumbnails
+)
 
 User = get_user_model()
 
@@ -64,6 +84,7 @@ class PostVIEWSTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -163,6 +184,74 @@ class PostVIEWSTests(TestCase):
                 form_field = response.context.get('form').fields.get(value)
                 self.assertIsInstance(form_field, expected)
 
+    @override_settings(TASKS_EAGER=False)
+    def test_pending_thumbnail_shows_placeholder(self):
+        """Пока миниатюра строится в фоне, выводится заглушка."""
+        cache.clear()
+        schedule_thumbnails(self.post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, 'img/placeholder.svg')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_index_shows_image_once_thumbnails_are_built(self):
+        """Главная страница показывает изображение после построения
+        миниатюр, не дожидаясь истечения кэша фрагмента."""
+        cache.clear()
+        schedule_thumbnails(self.post.image.name)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'img/placeholder.svg')
+        generate_thumbnails(self.post.image.name)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    @override_settings(TASKS_EAGER=True)
+    def test_thumbnails_generated_on_schedule(self):
+        """Без очереди задач миниатюры строятся сразу."""
+        cache.clear()
+        schedule_thumbnails(self.post.image.name)
+        self.assertFalse(is_pending(self.post.image.name))
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    @override_settings(
+        THUMBNAIL_SRCSET_WIDTHS=[480, 960],
+        THUMBNAIL_SRCSET_FORMATS=['PNG', 'JPEG']
+    )
+    def test_post_image_uses_responsive_picture(self):
+        """Изображение выводится в <picture> с srcset и запасным JPEG."""
+        cache.clear()
+        generate_thumbnails(self.post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        content = response.content.decode()
+        self.assertIn('<source type="image/png"', content)
+        self.assertIn('loading="lazy"', content)
+        self.assertIn(' 480w, ', content)
+        self.assertIn('.jpg 960w"', content)
+        self.assertIn('width="960" height="339"', content)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_missing_thumbnails_are_scheduled_not_built(self):
+        """Без готовых миниатюр тег выводит заглушку и ставит задачу,
+        не строя миниатюры при отрисовке."""
+        cache.clear()
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.'
+                        'get_thumbnail') as get_thumbnail, \
+                mock.patch.object(generate_thumbnails, 'delay') as delay:
+            response = self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        get_thumbnail.assert_not_called()
+        delay.assert_called_once_with(
+            self.post.image.name,
+            idempotency_key=f'thumbnails:{self.post.image.name}'
+        )
+        self.assertContains(response, 'img/placeholder.svg')
+        self.assertTrue(is_pending(self.post.image.name))
+
     def test_post_in_the_right_group(self):
         """ Проверяем что пост не попал в другую группу """
         response = self.authorized_client.get(
@@ -188,6 +277,7 @@ class PaginatorViewsTest(TestCase):
         cls.post = Post.objects.bulk_create(objs=objs)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -227,6 +317,119 @@ class PaginatorViewsTest(TestCase):
                                    + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_next_page_contains_three_records(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertIsNotNone(first_page.next_cursor)
+        response = self.client.get(url + '?cursor=' + first_page.next_cursor)
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        # Страницы не пересекаются
+        self.assertFalse(
+            set(first_page.object_list) & set(second_page.object_list)
+        )
+
+    def test_page_count_is_cached_until_posts_change(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                page_obj = self.authorized_client.get(
+                    url + '?page=2').context['page_obj']
+            self.assertEqual(page_obj.paginator.count,
+                             self.group.posts.count())
+            return sum('COUNT(' in query['sql']
+                       for query in context.captured_queries)
+
+        self.assertEqual(count_queries(), 1)
+        self.assertEqual(count_queries(), 0)
+        Post.objects.create(author=self.user, group=self.group, text='Ещё')
+        self.assertEqual(count_queries(), 1)
+
+    @override_settings(PAGINATOR_ESTIMATE_THRESHOLD=5)
+    def test_large_feed_count_is_estimated(self):
+        url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}) + '?page=2'
+        exact = self.group.posts.count()
+        paginator = self.authorized_client.get(
+            url).context['page_obj'].paginator
+        self.assertFalse(paginator.approximate)
+        # Выше порога количество берётся из кэша без COUNT(*)
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.approximate)
+        self.assertEqual(paginator.count, exact)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in context.captured_queries))
+        self.assertContains(response, f'примерно {exact} записей')
+        # Сигналы поддерживают количество при добавлении и удалении
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Ещё')
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         exact + 1)
+        post.group = None
+        post.save()
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, exact)
+        Post.objects.filter(group=self.group).first().delete()
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         exact - 1)
+
+    def test_cursor_previous_page_returns_first_page(self):
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url + '?cursor=' + first_page.next_cursor).context['page_obj']
+        response = self.client.get(
+            url + '?cursor=' + second_page.previous_cursor)
+        self.assertEqual(
+            list(response.context['page_obj'].object_list),
+            list(first_page.object_list)
+        )
+
+    def test_cursor_last_page(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        response = self.client.get(url + '?cursor=' + first_page.last_cursor)
+        last_page = response.context['page_obj']
+        self.assertEqual(len(last_page), 10)
+        self.assertTrue(last_page.has_previous())
+        self.assertFalse(last_page.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.client.get(url + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_without_id_returns_first_page(self):
+        def cursor(data):
+            raw = json.dumps(data).encode()
+            return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+        key = '2020-01-01T00:00:00+00:00'
+        broken = [
+            cursor({'r': False, 'd': key}),
+            cursor({'r': True, 'd': key}),
+            cursor({'r': False, 'd': key, 'i': None}),
+            cursor({'r': False, 'd': 'не дата', 'i': 1}),
+        ]
+        comments_url = reverse('posts:post_comments',
+                               kwargs={'post_id': Post.objects.first().pk})
+        for value in broken:
+            with self.subTest(cursor=value):
+                response = self.client.get(
+                    reverse('posts:index') + f'?cursor={value}')
+                self.assertEqual(len(response.context['page_obj']), 10)
+                self.assertFalse(
+                    response.context['page_obj'].has_previous())
+                response = self.client.get(comments_url + f'?cursor={value}')
+                self.assertEqual(response.status_code, 200)
+
 
 # Тестирование кэша
 class CashTemplatesTest(TestCase):
@@ -248,16 +451,30 @@ class CashTemplatesTest(TestCase):
 
     def test_cache_page(self):
         '''Тестируем кэш главной траницы'''
-        response = self.authorized_client.get(
-            reverse('posts:index')).content
-        self.post_cash.delete()
-        response_cache = self.authorized_client.get(
-            reverse('posts:index')).content
+        cache.clear()
+        response = self.guest_client.get(reverse('posts:index')).content
+        # Повторный запрос обслуживается из кэша без обращений к базе
+        with self.assertNumQueries(0):
+            response_cache = self.guest_client.get(
+                reverse('posts:index')).content
         self.assertEqual(response, response_cache)
+
+    def test_cache_invalidated_on_delete(self):
+        '''Удалённый пост сразу пропадает с главной страницы'''
         cache.clear()
-        response_clear = self.authorized_client.get(
-            reverse('posts:index')).content
-        self.assertNotEqual(response, response_clear)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post_cash.text)
+        self.post_cash.delete()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post_cash.text)
+
+    def test_cache_varies_on_page(self):
+        '''Разные страницы и поисковые запросы кэшируются отдельно'''
+        cache.clear()
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': 'несуществующий'})
+        self.assertNotContains(response, self.post_cash.text)
 
 
 # Тестирование подписок
@@ -311,3 +528,651 @@ class FollowViewsTest(TestCase):
             author=self.user).delete()
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, 'Тестируем подписки')
+
+    def test_new_post_fanned_out_to_followers(self):
+        '''Новый пост автора попадает в материализованную ленту
+        подписчика, а после отписки пропадает из неё'''
+        Follow.objects.create(user=self.user1, author=self.user)
+        post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user1, post=post).exists()
+        )
+        Follow.objects.filter(user=self.user1, author=self.user).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user1).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_merged_on_read(self):
+        '''Посты популярного автора не раскладываются по лентам,
+        но видны в ленте подписчика'''
+        Follow.objects.create(user=self.user1, author=self.user)
+        Post.objects.create(author=self.user, text='Пост популярного автора')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user1).exists()
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост популярного автора')
+        self.assertContains(response, 'Тестируем подписки')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_posts_kept_when_author_is_no_longer_popular(self):
+        '''Посты, опубликованные пока у автора было больше
+        TIMELINE_FANOUT_LIMIT подписчиков, остаются в ленте после отписки'''
+        user2 = User.objects.create_user(username='User_test2')
+        Follow.objects.create(user=self.user1, author=self.user)
+        Follow.objects.create(user=user2, author=self.user)
+        post = Post.objects.create(author=self.user, text='Пост до отписки')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост до отписки')
+        Follow.objects.filter(user=user2).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user1, post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост до отписки')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TASKS_EAGER=False)
+    def test_posts_merged_until_author_is_materialized(self):
+        '''Пока задача раскладки не выполнена, посты автора, переставшего
+        быть популярным, подмешиваются в ленту при чтении'''
+        user2 = User.objects.create_user(username='User_test2')
+        Follow.objects.create(user=self.user1, author=self.user)
+        Follow.objects.create(user=user2, author=self.user)
+        post = Post.objects.create(author=self.user, text='Пост до отписки')
+        Follow.objects.filter(user=user2).delete()
+        cache.clear()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост до отписки')
+        materialize_author(self.user.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user1, post=post).exists())
+        self.assertFalse(AuthorStats.objects.get(user=self.user).celebrity)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_pages_merge_popular_authors(self):
+        '''Курсорные страницы ленты сливают материализованные посты
+        и посты популярных авторов без повторов и пропусков'''
+        cache.clear()
+        popular = User.objects.create_user(username='Popular')
+        user2 = User.objects.create_user(username='User_test2')
+        Follow.objects.create(user=self.user1, author=self.user)
+        Follow.objects.create(user=self.user1, author=popular)
+        Follow.objects.create(user=user2, author=popular)
+        for i in range(POSTS_PER_PAGE):
+            Post.objects.create(author=self.user, text=f'Обычный {i}')
+            Post.objects.create(author=popular, text=f'Популярный {i}')
+        entry = TimelineEntry.objects.filter(user=self.user1).first()
+        self.assertEqual(entry.pub_date, entry.post.pub_date)
+        expected = list(Post.objects.filter(
+            author__in=[self.user, popular]
+        ).order_by('-pub_date', '-id').values_list('pk', flat=True))
+        url = reverse('posts:follow_index')
+        seen, cursor = [], ''
+        while cursor is not None:
+            page_obj = self.authorized_client.get(
+                url, {'cursor': cursor}).context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(seen, expected)
+        previous = self.authorized_client.get(
+            url, {'cursor': page_obj.previous_cursor}).context['page_obj']
+        self.assertEqual([post.pk for post in previous],
+                         expected[-POSTS_PER_PAGE - len(page_obj):
+                                  -len(page_obj)])
+
+    def test_failed_rebuild_keeps_timeline(self):
+        '''Ошибка при пересборке ленты не оставляет её пустой'''
+        Follow.objects.create(user=self.user1, author=self.user)
+        with mock.patch('posts.timeline.add_author', side_effect=Exception):
+            with self.assertRaises(Exception):
+                rebuild_timeline(self.user1.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user1, post=self.post).exists())
+
+    def test_backfill_timelines_command(self):
+        '''Команда backfill_timelines восстанавливает ленту'''
+        Follow.objects.create(user=self.user1, author=self.user)
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timelines', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user1, post=self.post).exists())
+
+
+# Тестирование поиска
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='User_test')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Полнотекстовый поиск по постам',
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user,
+            text='Совсем другой текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:index'), {'search': query})
+        return list(response.context['page_obj'].object_list)
+
+    def test_search_finds_post_by_word_prefix(self):
+        self.assertEqual(self.search('поиск'), [self.post])
+        self.assertEqual(self.search('ПОЛНОТЕКСТ'), [self.post])
+
+    def test_search_index_follows_edit_and_delete(self):
+        self.post.text = 'Отредактированный текст'
+        self.post.save()
+        self.assertEqual(self.search('поиск'), [])
+        self.assertEqual(self.search('отредактированный'), [self.post])
+        self.post.delete()
+        self.assertEqual(self.search('отредактированный'), [])
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"поиск* ('), [self.post])
+        self.assertEqual(self.search('***'), [])
+
+    def test_rebuild_search_index_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('другой'), [self.other_post])
+
+    def test_pagination_keeps_search_query(self):
+        response = self.client.get(reverse('posts:index'), {'search': 'пост'})
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, 1
+        )
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'пост {i}') for i in range(10)
+        ])
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:index'), {'search': 'пост'})
+        self.assertContains(
+            response, '?search=%D0%BF%D0%BE%D1%81%D1%82&amp;page=2'
+        )
+
+
+# Тестирование количества запросов
+class QueryBudgetViewsTest(QueryBudgetMixin, TestCase):
+    # Бюджет не зависит от количества постов и комментариев на странице
+    QUERY_BUDGET = 10
+    # Действия дополнительно обновляют ленты, счётчики и поиск
+    ACTION_QUERY_BUDGET = 20
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='User_test')
+        for i in range(12):
+            author = User.objects.create_user(username=f'author_{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group_{i}',
+                description='Описание',
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            post = Post.objects.create(
+                author=author, group=group, text=f'Пост {i}'
+            )
+        cls.post = post
+        cls.group = group
+        for i in range(12):
+            commentator = User.objects.create_user(username=f'reader_{i}')
+            Comment.objects.create(
+                post=cls.post, author=commentator, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.post.author)
+
+    def test_views_fit_query_budget(self):
+        '''Страницы posts/views.py укладываются в бюджет запросов'''
+        author = self.post.author.username
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:index') + '?search=Пост',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with self.assertQueryBudget(self.QUERY_BUDGET):
+                    self.authorized_client.get(url)
+
+    def test_follow_index_fits_query_budget(self):
+        client = Client()
+        client.force_login(self.user)
+        with self.assertQueryBudget(self.QUERY_BUDGET):
+            client.get(reverse('posts:follow_index'))
+        with self.assertQueryBudget(self.QUERY_BUDGET):
+            client.get(reverse('posts:follow_index') + '?page=2')
+
+    def test_actions_fit_query_budget(self):
+        reader = User.objects.get(username='reader_0')
+        client = Client()
+        client.force_login(reader)
+        actions = [
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.post.author.username}),
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.post.author.username}),
+        ]
+        for url in actions:
+            with self.subTest(url=url):
+                with self.assertQueryBudget(self.ACTION_QUERY_BUDGET):
+                    client.post(url, {'text': 'Ещё комментарий'},
+                                HTTP_REFERER='/')
+
+
+# Тестирование счётчиков автора
+class AuthorStatsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_profile_stats(self):
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'}))
+        return response.context
+
+    def test_counters_follow_posts_and_follows(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        context = self.get_profile_stats()
+        self.assertEqual(context['posts_count'], 2)
+        self.assertEqual(context['stats'].followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        post.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        context = self.get_profile_stats()
+        self.assertEqual(context['posts_count'], 1)
+        self.assertEqual(context['stats'].followers_count, 0)
+
+    def test_post_detail_uses_counter(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual(response.context['count'], 1)
+
+    def test_profile_without_stats(self):
+        context = self.get_profile_stats()
+        self.assertEqual(context['posts_count'], 0)
+
+    def test_reconcile_author_stats_command(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {i}') for i in range(3)
+        ])
+        AuthorStats.objects.create(user=self.reader, following_count=5)
+        call_command(
+            'reconcile_author_stats', batch_size=1, stdout=StringIO()
+        )
+        self.assertEqual(self.get_profile_stats()['posts_count'], 3)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 0
+        )
+
+
+class ExportViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост в группе'
+        )
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        Comment.objects.create(
+            post=cls.post, author=cls.staff, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def export(self, kind, **params):
+        response = self.staff_client.get(
+            reverse('posts:export', kwargs={'kind': kind}), params
+        )
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_requires_staff(self):
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:export', kwargs={'kind': 'posts'}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_posts_ndjson_filtered_by_group(self):
+        lines = self.export('posts', group='test-slug').splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['author'], 'Author')
+        self.assertEqual(row['text'], 'Пост в группе')
+
+    def test_export_comments_csv(self):
+        lines = self.export('comments', format='csv').splitlines()
+        self.assertEqual(lines[0], 'id,post,author,text,created')
+        self.assertIn('Staff,Комментарий', lines[1])
+
+    def test_export_invalid_filters(self):
+        response = self.staff_client.get(
+            reverse('posts:export', kwargs={'kind': 'posts'}),
+            {'since': '2021-02-01', 'until': '2021-01-01'}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.staff_client.get(
+            reverse('posts:export', kwargs={'kind': 'users'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': 'Author'}),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': 'test-slug'}),
+        }
+
+    def etag(self, url, client=None):
+        return (client or self.client).get(url)['ETag']
+
+    def test_not_modified_without_rendering(self):
+        client = Client()
+        client.force_login(self.reader)
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = client.get(url)
+                # Сессия, пользователь и состояние объекта
+                with self.assertNumQueries(3):
+                    response = client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_last_modified(self):
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.client.get(url)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_site_invalidation_changes_last_modified(self):
+        url = self.urls['post_detail']
+        # Пост и поколения страницы созданы час назад
+        an_hour_ago = time.time() - 60 * 60
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now() - timedelta(hours=1))
+        with mock.patch('core.cache.time.time', return_value=an_hour_ago):
+            last_modified = self.client.get(url)['Last-Modified']
+        invalidate_site()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        url = self.urls['post_detail']
+        etag = self.etag(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_moving_post_changes_both_groups(self):
+        old_group_etag = self.etag(self.urls['group_list'])
+        other_url = reverse(
+            'posts:group_list', kwargs={'slug': 'other-slug'})
+        other_group_etag = self.etag(other_url)
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertNotEqual(self.etag(self.urls['group_list']),
+                            old_group_etag)
+        self.assertNotEqual(self.etag(other_url), other_group_etag)
+
+    def test_follow_changes_profile_etag(self):
+        etag = self.etag(self.urls['profile'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertNotEqual(self.etag(self.urls['profile']), etag)
+
+    def test_authorized_user_has_own_etag(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = self.urls['post_detail']
+        response = client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotEqual(response['ETag'], self.etag(url))
+
+    def test_missing_objects_are_not_found(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+class PageCacheViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.group_url = reverse(
+            'posts:group_list', kwargs={'slug': 'test-slug'})
+        self.other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': 'other-slug'})
+
+    def cache_status(self, url):
+        return self.client.get(url).get('X-Page-Cache')
+
+    def test_anonymous_pages_served_from_cache(self):
+        for url in (reverse('posts:index'), self.post_url, self.group_url,
+                    reverse('posts:profile', kwargs={'username': 'Author'})):
+            with self.subTest(url=url):
+                self.assertEqual(self.cache_status(url), 'miss')
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.cache_status(url), 'hit')
+
+    def test_invalidation_is_targeted(self):
+        for url in (self.post_url, self.group_url, self.other_group_url):
+            self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assertEqual(self.cache_status(self.post_url), 'miss')
+        self.assertEqual(self.cache_status(self.group_url), 'hit')
+        self.assertEqual(self.cache_status(self.other_group_url), 'hit')
+        Post.objects.create(
+            author=self.author, group=self.other_group, text='Новый')
+        self.assertEqual(self.cache_status(self.other_group_url), 'miss')
+        self.assertEqual(self.cache_status(self.group_url), 'hit')
+
+    def test_authorized_user_bypasses_cache(self):
+        client = Client()
+        client.force_login(self.author)
+        self.client.get(self.post_url)
+        response = client.get(self.post_url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Добавить комментарий')
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk})
+
+    def test_post_detail_shows_first_page_and_count(self):
+        response = self.client.get(self.post_url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(
+            comments[0].text, f'Комментарий {COMMENTS_PER_PAGE + 4}')
+        self.assertEqual(response.context['comments_count'], 25)
+        self.assertContains(response, comments.next_cursor)
+
+    def test_load_more_fragment(self):
+        first = self.client.get(self.post_url).context['comments']
+        response = self.client.get(
+            self.comments_url, {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertContains(response, 'Комментарий 0')
+        self.assertNotContains(response, 'Комментарий 5<')
+        self.assertNotContains(response, 'js-more-comments')
+        # Без JavaScript та же страница открывается на странице поста
+        response = self.client.get(
+            self.post_url, {'comments_cursor': first.next_cursor})
+        self.assertEqual(len(response.context['comments']), 5)
+
+    def test_load_more_json(self):
+        response = self.client.get(self.comments_url, {'format': 'json'})
+        data = response.json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['comments']), COMMENTS_PER_PAGE)
+        self.assertEqual(data['comments'][0]['author'], 'Author')
+        data = self.client.get(self.comments_url, {
+            'format': 'json', 'cursor': data['next_cursor']
+        }).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [f'Комментарий {i}' for i in range(4, -1, -1)]
+        )
+        self.assertIsNone(data['next_cursor'])
+
+    def test_count_cached_until_comments_change(self):
+        self.assertEqual(comments_count(self.post.pk), 25)
+        with self.assertNumQueries(0):
+            self.assertEqual(comments_count(self.post.pk), 25)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый')
+        self.assertEqual(comments_count(self.post.pk), 26)
+
+    def test_missing_post_not_found(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class HotFeedViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий')
+        cls.discussed = Post.objects.create(
+            author=cls.author, text='Обсуждаемый')
+        cls.popular = Post.objects.create(author=cls.author, text='Горячий')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index') + '?feed=hot'
+
+    def comment(self, post, count=1):
+        for _ in range(count):
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий')
+
+    def hot_feed(self, url=None):
+        return list(self.client.get(url or self.url).context['page_obj'])
+
+    def test_hot_feed_ranks_by_comments(self):
+        self.assertEqual(self.hot_feed(), [])
+        self.comment(self.discussed)
+        self.comment(self.popular, 3)
+        self.assertEqual(self.hot_feed(), [self.popular, self.discussed])
+        self.popular.refresh_from_db()
+        self.assertAlmostEqual(current_weight(self.popular.hot_score), 3,
+                               places=3)
+
+    def test_follow_heats_recent_posts_of_author(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(set(self.hot_feed()),
+                         {self.quiet, self.discussed, self.popular})
+        self.quiet.refresh_from_db()
+        self.assertAlmostEqual(current_weight(self.quiet.hot_score),
+                               settings.HOT_FOLLOW_WEIGHT, places=3)
+
+    @override_settings(HOT_HALF_LIFE=60)
+    def test_older_comments_weigh_less(self):
+        self.comment(self.discussed, 2)
+        Comment.objects.filter(post=self.discussed).update(
+            created=timezone.now() - timedelta(minutes=3))
+        call_command('decay_hot_scores', rebuild=True, stdout=StringIO())
+        self.comment(self.popular)
+        self.assertEqual(self.hot_feed(), [self.popular, self.discussed])
+
+    def test_cursor_pagination(self):
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(POSTS_PER_PAGE + 2)
+        ]
+        for count, post in enumerate(posts, 1):
+            self.comment(post, count)
+        page_obj = self.client.get(self.url).context['page_obj']
+        self.assertEqual(list(page_obj), posts[::-1][:POSTS_PER_PAGE])
+        next_page = self.hot_feed(
+            self.url + '&cursor=' + page_obj.next_cursor)
+        self.assertEqual(next_page, posts[1::-1])
+
+    def test_hot_feed_cache_follows_score_changes(self):
+        self.assertEqual(self.hot_feed(), [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(len(self.hot_feed()), 3)
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что код укладывается в бюджет SQL-запросов."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = context.captured_queries
+        if len(queries) > budget:
+            self.fail(
+                f'Выполнено {len(queries)} запросов при бюджете {budget}:\n'
+                + '\n'.join(query['sql'] for query in queries)
+            )
@@ -0,0 +1,189 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Новый пост автора сразу раскладывается в ленты его подписчиков, поэтому
+follow_index читает готовую ленту вместо соединения posts_post и
+posts_follow. Посты авторов с очень большим числом подписчиков
+не раскладываются: они подмешиваются в ленту при чтении. Такие авторы
+отмечены AuthorStats.celebrity. Отметка ставится, как только
+подписчиков становится больше TIMELINE_FANOUT_LIMIT, а снимается
+задачей materialize_author вместе с раскладкой последних постов
+автора по лентам всех подписчиков.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from core.tasks import task
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import POSTS_PER_PAGE, TimelineCursorPaginator
+
+
+def fanout_limit():
+    return settings.TIMELINE_FANOUT_LIMIT
+
+
+def is_celebrity(author_id):
+    """Посты автора подмешиваются в ленты при чтении."""
+    return AuthorStats.objects.filter(
+        user_id=author_id, celebrity=True
+    ).exists()
+
+
+def update_celebrity(author_id):
+    """Сверить отметку популярности с числом подписчиков автора.
+
+    Автор становится популярным сразу, а перестаёт - только после
+    раскладки его постов задачей materialize_author. Возвращает
+    текущую отметку.
+    """
+    limit = fanout_limit()
+    stats = AuthorStats.objects.filter(user_id=author_id)
+    if stats.filter(
+        celebrity=False, followers_count__gt=limit
+    ).update(celebrity=True):
+        return True
+    row = stats.values_list('celebrity', 'followers_count').first()
+    if row is None:
+        return False
+    celebrity, followers = row
+    if celebrity and followers <= limit:
+        materialize_author.delay(
+            author_id, idempotency_key=f'timeline:materialize:{author_id}'
+        )
+    return celebrity
+
+
+def followed_celebrities(user):
+    """id популярных авторов, на которых подписан пользователь."""
+    return list(Follow.objects.filter(
+        user=user, author__stats__celebrity=True
+    ).values_list('author_id', flat=True))
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Разложить новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def _recent_posts(author_id):
+    # Последние посты автора, которые добавляются в ленту целиком
+    return list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_SIZE])
+
+
+def add_author(user_id, author_id):
+    """Добавить в ленту последние посты автора после подписки."""
+    if update_celebrity(author_id):
+        return
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in _recent_posts(author_id)
+    )
+
+
+def author_unfollowed(author_id):
+    """Разложить посты автора, если он перестал быть популярным."""
+    update_celebrity(author_id)
+
+
+@task
+def materialize_author(author_id):
+    """Добавить последние посты автора в ленты всех его подписчиков.
+
+    Пока подписчиков было больше TIMELINE_FANOUT_LIMIT, посты автора
+    не раскладывались и показывались только слиянием при чтении.
+    Отметка популярности снимается в одной транзакции с раскладкой,
+    поэтому посты не пропадают из лент ни на время её выполнения, ни
+    если задача не выполнилась.
+    """
+    with transaction.atomic():
+        stats = AuthorStats.objects.select_for_update().filter(
+            user_id=author_id, celebrity=True,
+            followers_count__lte=fanout_limit()
+        ).first()
+        if stats is None:
+            # Автор снова популярен или его посты уже разложены
+            return
+        posts = _recent_posts(author_id)
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          pub_date=pub_date)
+            for user_id in followers.iterator()
+            for post_id, pub_date in posts
+        )
+        stats.celebrity = False
+        stats.save(update_fields=['celebrity'])
+
+
+def remove_author(user_id, author_id):
+    """Убрать посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild_timeline(user_id):
+    """Пересобрать ленту пользователя с нуля.
+
+    Удаление и заполнение выполняются в одной транзакции: читатель
+    не увидит пустую ленту.
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        authors = Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        )
+        for author_id in authors:
+            add_author(user_id, author_id)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя.
+
+    Материализованная часть берётся из TimelineEntry, посты популярных
+    авторов (fan-out on read) добавляются условием по автору.
+    """
+    condition = Q(pk__in=TimelineEntry.objects.filter(
+        user=user
+    ).values('post'))
+    followed = followed_celebrities(user)
+    if followed:
+        condition |= Q(author_id__in=followed)
+    return Post.objects.filter(condition)
+
+
+def timeline_paginator(user, posts):
+    """Курсорный Paginator ленты подписок; posts - запрос постов страницы.
+
+    Ключи страницы берутся из TimelineEntry, посты каждого популярного
+    автора - отдельным запросом по индексу (author, -pub_date, -id).
+    """
+    return TimelineCursorPaginator(
+        TimelineEntry.objects.filter(user=user), POSTS_PER_PAGE, posts,
+        merged=[
+            Post.objects.filter(author_id=author_id)
+            for author_id in followed_celebrities(user)
+        ]
+    )
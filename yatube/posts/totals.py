@@ -0,0 +1,67 @@
+"""Кэшированные количества постов в лентах.
+
+По ним EstimatedCountPaginator решает, считать ли COUNT(*) точно.
+Сигналы Post изменяют количества на единицу, а массовые операции
+сбрасывают их сменой поколения сайта (invalidate_site).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import get_generation
+from core.estimates import estimated_rows
+from core.pagecache import SITE_GENERATION
+
+from .conditional import GROUP, USER
+from .models import Post
+
+# Лента всех постов на главной странице
+ALL = 'all'
+
+
+def scope(kind, pk):
+    """Лента автора (USER) или группы (GROUP)."""
+    return f'{kind}:{pk}'
+
+
+def _key(name):
+    return 'posts:total:{}:{}'.format(get_generation(SITE_GENERATION), name)
+
+
+def get_total(name):
+    """Количество постов ленты из кэша или None, если его нет.
+
+    Для ленты всех постов недостающее количество берётся из статистики
+    базы данных; количества остальных лент сохраняет set_total.
+    """
+    total = cache.get(_key(name))
+    if total is None and name == ALL:
+        total = estimated_rows(Post)
+        if total is not None:
+            set_total(name, total)
+    return total
+
+
+def set_total(name, total):
+    cache.add(_key(name), total, settings.FEED_CACHE_TIMEOUT)
+
+
+def change_total(name, delta):
+    """Изменить количество, если оно уже есть в кэше."""
+    try:
+        cache.incr(_key(name), delta)
+    except ValueError:
+        pass
+
+
+def change_post_totals(post, delta):
+    change_total(ALL, delta)
+    change_total(scope(USER, post.author_id), delta)
+    if post.group_id is not None:
+        change_total(scope(GROUP, post.group_id), delta)
+
+
+def move_post_total(previous_group_id, group_id):
+    if previous_group_id is not None:
+        change_total(scope(GROUP, previous_group_id), -1)
+    if group_id is not None:
+        change_total(scope(GROUP, group_id), 1)
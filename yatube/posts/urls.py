@@ -18,6 +18,11 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     # Удаление записи
     path('posts/<int:post_id>/delete/', views.post_delete, name='post_delete'),
+    # Подгрузка коментариев
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments, name='post_comments'
+    ),
     # Добавление коментария
     path(
         'posts/<int:post_id>/comment/',
@@ -37,4 +42,6 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    # Выгрузка постов и комментариев для сотрудников
+    path('export/<str:kind>/', views.export_content, name='export'),
 ]
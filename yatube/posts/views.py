@@ -1,39 +1,87 @@
-from django.core.paginator import Paginator
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.functional import SimpleLazyObject
 from .models import Post, Group, User, Follow
-from .forms import PostForm, CommentForm
+from .cache import FEED_GENERATION, feed_generation
+from . import conditional, totals
+from .comments import comments_count, comments_page, serialize_comment
+from .hot import HOT_GENERATION, hot_generation, hot_posts
+from .export import FIELDS, FORMATS, export_lines
+from .forms import PostForm, CommentForm, ExportFilterForm
+from .paginators import POSTS_PER_PAGE, HotCursorPaginator, paginate
+from .search import search_page
+from .stats import get_stats
+from .timeline import timeline_paginator, timeline_posts
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.views.decorators.http import condition
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (
+    Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse,
+    StreamingHttpResponse
+)
+from core.pagecache import add_cache_tags, cache_anonymous_page
+from core.thumbnails import (
+    THUMBNAILS_GENERATION, schedule_thumbnails, thumbnails_generation
+)
 
 
+@cache_anonymous_page
 def index(request):
     '''Главная страница'''
+    add_cache_tags(request, FEED_GENERATION, THUMBNAILS_GENERATION)
     search_query = request.GET.get('search', '')
-    if search_query:
-        posts = Post.objects.filter(text__icontains=search_query)
-    else:
-        posts = Post.objects.all()
+    # ?feed=hot - посты, отсортированные по рейтингу posts.hot
+    hot_feed = request.GET.get('feed') == 'hot'
+    # Фрагмент с заглушками миниатюр устаревает, когда они построены
+    generation = f'{feed_generation()}-{thumbnails_generation()}'
+    if hot_feed:
+        add_cache_tags(request, HOT_GENERATION)
+        generation = f'{generation}-{hot_generation()}'
+
+    def get_page_obj():
+        if search_query:
+            return search_page(
+                search_query, request.GET.get('page'), POSTS_PER_PAGE
+            )
+        if hot_feed:
+            return paginate(
+                request, hot_posts().select_related('author', 'group'),
+                cursor_class=HotCursorPaginator
+            )
+        return paginate(
+            request, Post.objects.select_related('author', 'group'),
+            count_scope=totals.ALL
+        )
+
     template = 'posts/index.html'
     title = 'Это главная страница проекта Yatube'
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
+    # Страница вычисляется лениво: при попадании в кэш фрагмента
+    # запросы к базе не выполняются.
     context = {
         'title': title,
-        'page_obj': page_obj,
+        'page_obj': SimpleLazyObject(get_page_obj),
+        'hot_feed': hot_feed,
+        'feed_generation': generation,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
+@condition(etag_func=conditional.group_etag,
+           last_modified_func=conditional.group_last_modified)
 def group_posts(request, slug):
     '''Страница с постами отфильтрованная по группам'''
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    add_cache_tags(
+        request, *conditional.list_generations(conditional.GROUP, group.pk)
+    )
+    posts = group.posts.select_related('author', 'group')
+    page_obj = paginate(
+        request, posts,
+        count_scope=totals.scope(conditional.GROUP, group.pk)
+    )
 
     context = {
         'group': group,
@@ -42,55 +90,107 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@cache_anonymous_page
+@condition(etag_func=conditional.profile_etag,
+           last_modified_func=conditional.profile_last_modified)
 def profile(request, username):
     '''Профайл автора'''
     template = 'posts/profile.html'
-    user_name = get_object_or_404(User, username=username)
+    user_name = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    add_cache_tags(
+        request,
+        *conditional.list_generations(conditional.USER, user_name.pk)
+    )
     title = (f'Профайл пользователя: {user_name}')
-    posts = Post.objects.filter(author=user_name)
-    posts_count = posts.count()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.filter(author=user_name).select_related(
+        'author', 'group'
+    )
+    stats = get_stats(user_name)
+    page_obj = paginate(
+        request, posts,
+        count_scope=totals.scope(conditional.USER, user_name.pk)
+    )
     user = request.user
     following = user.is_authenticated and user_name.following.exists()
     context = {
         'title': title,
         'user_name': user_name,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'following': following
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
+@condition(etag_func=conditional.post_detail_etag,
+           last_modified_func=conditional.post_detail_last_modified)
 def post_detail(request, post_id):
     '''Информация о посте'''
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group', 'author__stats'),
+        pk=post_id
+    )
+    add_cache_tags(
+        request, *conditional.post_generations(post.pk, post.author_id)
+    )
+    count = get_stats(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    # Без JavaScript ссылка «Показать ещё» открывает следующую страницу
+    # комментариев через ?comments_cursor
+    comments = comments_page(post.pk, request.GET.get('comments_cursor'))
     context = {
         'post': post,
         'count': count,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'comments_count': comments_count(post.pk),
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
+@condition(etag_func=conditional.post_detail_etag,
+           last_modified_func=conditional.post_detail_last_modified)
+def post_comments(request, post_id):
+    '''Следующая страница комментариев: HTML-фрагмент или JSON'''
+    post = get_object_or_404(
+        Post.objects.only('pk', 'author_id'), pk=post_id
+    )
+    add_cache_tags(
+        request, *conditional.post_generations(post.pk, post.author_id)
+    )
+    comments = comments_page(post.pk, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'count': comments_count(post.pk),
+            'comments': [serialize_comment(comment) for comment in comments],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required  # Доступно авторизированым пользователям
 def post_create(request):
     '''Создать пост'''
     template = 'posts/create_post.html'
     title = 'Добавить запись'
 
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        if post.image:
+            schedule_thumbnails(post.image.name)
         return redirect('posts:profile', post.author.username)
 
     context = {
@@ -114,6 +214,8 @@ def post_edit(request, post_id):
                     )
     if request.user == post.author and form.is_valid():
         form.save()
+        if 'image' in form.changed_data and post.image:
+            schedule_thumbnails(post.image.name)
         return redirect('posts:post_detail', post.id)
 
     context = {
@@ -151,10 +253,15 @@ def add_comment(request, post_id):
 def follow_index(request):
     template = 'posts/follow.html'
     user = request.user
-    posts = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if request.GET.get('page'):
+        # Старые ссылки с номером страницы
+        posts = timeline_posts(user).select_related('author', 'group')
+        page_obj = paginate(request, posts)
+    else:
+        posts = Post.objects.select_related('author', 'group')
+        page_obj = timeline_paginator(user, posts).get_page(
+            request.GET.get('cursor')
+        )
     context = {
         'template': template,
         'page_obj': page_obj
@@ -179,3 +286,22 @@ def profile_unfollow(request, username):
     user = request.user
     Follow.objects.filter(user=user, author__username=username).delete()
     return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+
+
+@staff_member_required
+def export_content(request, kind):
+    '''Потоковая выгрузка постов или комментариев для аналитики'''
+    export_format = request.GET.get('format', 'ndjson')
+    if kind not in FIELDS or export_format not in FORMATS:
+        raise Http404
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    response = StreamingHttpResponse(
+        export_lines(kind, export_format, **form.cleaned_data),
+        content_type=f'{FORMATS[export_format]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{export_format}"'
+    )
+    return response
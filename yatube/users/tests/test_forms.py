@@ -1,6 +1,14 @@
-from django.test import Client, TestCase
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+
+from core.models import Task
+
 User = get_user_model()
 
 
@@ -33,3 +41,18 @@ class UserFormTest(TestCase):
         self.assertRedirects(response, reverse('posts:index',))
         # Проверяем, увеличилось ли число постов
         self.assertEqual(User.objects.count(), users_count + 1)
+
+
+@override_settings(TASKS_EAGER=False)
+class PasswordResetFormTest(TransactionTestCase):
+
+    def test_reset_email_sent_by_task(self):
+        User.objects.create_user(
+            username='Alex', email='mail@yandex.ru', password='U61212fefe')
+        self.client.post(
+            reverse('users:password_reset'), {'email': 'mail@yandex.ru'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().name, 'core.mail.send_email')
+        call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['mail@yandex.ru'])
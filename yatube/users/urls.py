@@ -6,6 +6,7 @@ from django.contrib.auth.views import PasswordResetCompleteView
 from django.urls import path
 
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -44,7 +45,8 @@ urlpatterns = [
     # Восстановление пароля
     path('password_reset/',
          PasswordResetView.as_view(
-             template_name='users/password_reset_form.html'),
+             template_name='users/password_reset_form.html',
+             form_class=QueuedPasswordResetForm),
          name='password_reset'
          ),
 
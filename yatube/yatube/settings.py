@@ -51,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,7 +71,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')  # Дериктория с 
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],  # Подключени дериктории с шаблонами
         'APP_DIRS': True,
         'OPTIONS': {
@@ -151,12 +154,124 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий кэш (в продакшене - memcached или redis) и небольшой LRU-кэш
+# процесса перед ним; LOCAL_TIMEOUT ограничивает, насколько долго
+# процесс может не видеть изменений, сделанных другими процессами.
 CACHES = {
     'default': {
+        'BACKEND': 'core.backends.cache.InstrumentedTwoTierCache',
+        'OPTIONS': {
+            'SHARED_CACHE': 'shared',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_MAX_BYTES': 8 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
-] 
\ No newline at end of file
+]
+
+# Ленты подписок: посты авторов, у которых подписчиков больше
+# TIMELINE_FANOUT_LIMIT, не раскладываются по лентам при публикации,
+# а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора добавить в ленту после подписки
+TIMELINE_BACKFILL_SIZE = 200
+TIMELINE_BATCH_SIZE = 500
+
+# Поиск по постам: бэкенд и максимальное количество результатов.
+# Для баз данных без FTS5 - 'posts.search.DatabaseSearchBackend'.
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteFTS5Backend'
+POSTS_SEARCH_LIMIT = 1000
+
+# Время жизни кэша ленты на главной странице; свежесть обеспечивается
+# сменой поколения кэша при изменении данных.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Миниатюры изображений постов: ширины для srcset, отношение высоты
+# к ширине и форматы (первый - предпочтительный, последний - запасной).
+# Все варианты строятся сразу после загрузки и командой warm_thumbnails.
+THUMBNAIL_SRCSET_WIDTHS = [480, 720, 960]
+THUMBNAIL_SRCSET_RATIO = 339 / 960
+THUMBNAIL_SRCSET_FORMATS = ['WEBP', 'JPEG']
+
+# Доля запросов, для которых PerformanceMiddleware добавляет заголовок
+# Server-Timing и пишет строку в лог core.performance (от 0 до 1)
+PERFORMANCE_SAMPLE_RATE = 0.05
+
+# Время жизни страниц в кэше для анонимных посетителей
+# (core.pagecache); изменения данных сбрасывают его раньше.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Реплики основной базы только для чтения (псевдонимы из DATABASES).
+# Локально реплику имитирует второй файл SQLite: задайте переменную
+# окружения YATUBE_SQLITE_REPLICA и запустите
+# manage.py replicate_sqlite --interval 1.
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+# Сколько секунд после записи пользователь читает с основной базы
+DATABASE_STICKY_SECONDS = 10
+
+# PRAGMA для каждого соединения с SQLite (core.sqlite): WAL и ожидание
+# блокировки вместо ошибки при одновременной записи. cache_size в
+# отрицательных значениях задаётся в КиБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+# Начиная с этого количества постов в ленте номерная пагинация
+# (?page=N) не выполняет COUNT(*), а показывает примерное количество
+# (posts.paginators.EstimatedCountPaginator).
+PAGINATOR_ESTIMATE_THRESHOLD = 10000
+
+# «Горячие» посты (posts.hot): период полураспада веса события в
+# секундах, веса комментария и подписки на автора, за сколько дней
+# посты автора получают вес новой подписки и вес, ниже которого пост
+# убирается из ленты командой decay_hot_scores.
+HOT_HALF_LIFE = 60 * 60 * 12
+HOT_COMMENT_WEIGHT = 1.0
+HOT_FOLLOW_WEIGHT = 0.5
+HOT_FOLLOW_WINDOW_DAYS = 3
+HOT_MIN_WEIGHT = 0.05
+
+# Очередь фоновых задач (core.tasks), обработчик - manage.py run_tasks.
+# TASKS_EAGER выполняет задачи сразу при постановке; его включают
+# тесты (core.runners.TestRunner), которым не нужен отдельный
+# обработчик. Задержка первого повтора в секундах удваивается с каждой
+# попыткой до TASKS_MAX_RETRY_DELAY; завершённые задачи хранятся
+# TASKS_RETENTION_DAYS дней.
+TASKS_EAGER = False
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_MAX_RETRY_DELAY = 60 * 60
+TASKS_LEASE_SECONDS = 60 * 5
+TASKS_RETENTION_DAYS = 7
+
+# Метрики Prometheus (core.metrics) на /metrics. Если несколько
+# процессов обслуживают запросы или выполняют задачи, задайте общий
+# каталог переменной окружения YATUBE_METRICS_DIR: процессы пишут туда
+# свои значения не чаще раза в METRICS_FLUSH_INTERVAL секунд.
+# /metrics доступен только с адресов METRICS_ALLOWED_IPS.
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# manage.py test выполняет фоновые задачи сразу (TASKS_EAGER)
+TEST_RUNNER = 'core.runners.TestRunner'